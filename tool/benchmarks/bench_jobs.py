@@ -0,0 +1,45 @@
+################
+# benchmark the scaling of unite_data_v3.py --jobs on a synthetic screen with many measurement folders
+# every job count is compared with a single process run, which is also checked to write the same table
+#   python tool/benchmarks/bench_jobs.py --plates 16 --max-jobs 8
+################
+
+import argparse
+import filecmp
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import synthetic_plates
+from bench_suite import SCRIPT, run
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark unite_data_v3.py with 1 to N processes.')
+
+    parser.add_argument("--plates",    dest='plates', type=int, default=8, help="Number of measurement folders in the synthetic screen.")
+    parser.add_argument("--nuclei",    dest='nuclei', type=int, default=20, help="Number of selected nuclei per field.")
+    parser.add_argument("--spots",     dest='spots', type=int, default=3, help="Mean spots per color and nucleus.")
+    parser.add_argument("--max-jobs",  dest='max_jobs', type=int, default=multiprocessing.cpu_count(), help="Highest number of processes to test.")
+    parser.add_argument("--streaming", dest='streaming', action='store_true', help="Benchmark the streaming mode.")
+
+    args = parser.parse_args()
+    options = ['--streaming'] if args.streaming else []
+    work_dir = tempfile.mkdtemp()
+
+    try:
+        data_folder = os.path.join(work_dir, 'screen')
+        synthetic_plates.write_screen(data_folder, plates=args.plates, nuclei=args.nuclei, spots=args.spots)
+
+        serial_file = os.path.join(work_dir, 'jobs1.tsv')
+        serial, memory = run(SCRIPT, data_folder, serial_file, options + ['--jobs', '1'])
+
+        print('\t'.join(['jobs', 'time [s]', 'speedup', 'identical']))
+        print('\t'.join(['1', '%.2f' % serial, '1.0x', 'True']))
+        for jobs in range(2, args.max_jobs + 1):
+            out_file = os.path.join(work_dir, 'jobs%d.tsv' % jobs)
+            parallel, memory = run(SCRIPT, data_folder, out_file, options + ['--jobs', str(jobs)])
+            print('\t'.join([str(jobs), '%.2f' % parallel, '%.1fx' % (serial / parallel), str(filecmp.cmp(serial_file, out_file, shallow=False))]))
+    finally:
+        shutil.rmtree(work_dir)
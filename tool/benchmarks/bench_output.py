@@ -0,0 +1,80 @@
+################
+# benchmark the output stage of unite_data_v3.py: MB of merged table written per second of the output stage as reported by --profile,
+# tables written with --compression are counted uncompressed
+# the output stage joins the records to lines and writes them, so it covers the whole writer
+# pass --reference with unite_data_v3.py of another revision to compare, the unite_data package has to be next to it, e.g.
+#   mkdir /tmp/unite_data_old && git archive HEAD~1 tool | tar -x -C /tmp/unite_data_old
+#   python tool/benchmarks/bench_output.py --reference /tmp/unite_data_old/tool/unite_data_v3.py
+# further options of the merge follow --, they are passed on as they are, e.g.
+#   python tool/benchmarks/bench_output.py -- --streaming --compression gzip
+################
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+import bench_suite
+import synthetic_plates
+from bench_suite import SCRIPT
+
+
+def run(script, data_folder, out_file, options):
+    ''' run one merge with bench_suite.run() and return the seconds of its output stage '''
+    profile_file = out_file + '.json'
+    bench_suite.run(script, data_folder, out_file, ['--profile', profile_file] + options)
+    with open(profile_file) as f:
+        stages = json.load(f)['stages']
+    return sum(stage['seconds'] for stage in stages if stage['stage'] == 'output')
+
+
+def table_size(out_file):
+    ''' MB of the merged table in out_file, tables written with --compression are counted uncompressed '''
+    with open(out_file, 'rb') as f:
+        magic = f.read(4)
+    if magic[:2] == b'\x1f\x8b':
+        in_file = gzip.open(out_file, 'rb')
+    elif magic == b'\x28\xb5\x2f\xfd':
+        import zstandard
+        in_file = zstandard.open(out_file, 'rb')
+    else:
+        return os.path.getsize(out_file) / 1024.0**2
+    with in_file:
+        return sum(len(block) for block in iter(lambda: in_file.read(1 << 20), b'')) / 1024.0**2
+
+
+def result(revision, out_file, seconds):
+    size = table_size(out_file)
+    return '\t'.join([revision, '%.2f' % seconds, '%.1f' % size, '%.1f' % (size / seconds)])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark the output throughput of unite_data_v3.py.')
+
+    parser.add_argument("--reference", dest='reference', type=str, default=None, help="unite_data_v3.py of another revision to compare with.")
+    parser.add_argument("--nuclei",    dest='nuclei', type=int, default=30, help="Number of selected nuclei per field.")
+    parser.add_argument("--spots",     dest='spots', type=int, default=3, help="Mean spots per color and nucleus.")
+    parser.add_argument("options",     type=str, nargs=argparse.REMAINDER, help="Further options of the merge after --, e.g. -- --streaming --compression gzip.")
+
+    args = parser.parse_args()
+    # argparse keeps the -- in front of the remainder
+    options = args.options[1:] if args.options[:1] == ['--'] else args.options
+    work_dir = tempfile.mkdtemp()
+
+    try:
+        data_folder = os.path.join(work_dir, 'screen')
+        synthetic_plates.write_screen(data_folder, rows=4, columns=6, fields=4, nuclei=args.nuclei, spots=args.spots)
+
+        out_file = os.path.join(work_dir, 'current.tsv')
+        current = run(SCRIPT, data_folder, out_file, options)
+        print('\t'.join(['revision', 'output [s]', 'table [MB]', 'MB/s']))
+        print(result('current', out_file, current))
+
+        if args.reference is not None:
+            reference_file = os.path.join(work_dir, 'reference.tsv')
+            reference = run(args.reference, data_folder, reference_file, options)
+            print(result('reference', reference_file, reference))
+    finally:
+        shutil.rmtree(work_dir)
@@ -0,0 +1,48 @@
+################
+# benchmark unite_data_v3.py on synthetic plates with an increasing number of spots per nucleus
+# pass --reference with an older revision of the script to compare run times and check that both write the same table,
+# the unite_data package of that revision has to be next to it, e.g.
+#   mkdir /tmp/unite_data_old && git archive HEAD~1 tool | tar -x -C /tmp/unite_data_old
+#   python tool/benchmarks/bench_spot_index.py --reference /tmp/unite_data_old/tool/unite_data_v3.py
+# bench_suite.py compares whole git revisions on more scenarios
+################
+
+import argparse
+import filecmp
+import os
+import shutil
+import tempfile
+
+import synthetic_plates
+from bench_suite import SCRIPT, run
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark the spot lookup of unite_data_v3.py on dense synthetic plates.')
+
+    parser.add_argument("--reference", dest='reference', type=str, default=None, help="Another revision of unite_data_v3.py to compare with.")
+    parser.add_argument("--spots",     dest='spots', type=int, nargs='+', default=[1, 2, 4, 8], help="Mean spots per color and nucleus to test.")
+    parser.add_argument("--nuclei",    dest='nuclei', type=int, default=20, help="Number of selected nuclei per field.")
+
+    args = parser.parse_args()
+    work_dir = tempfile.mkdtemp()
+
+    try:
+        print('\t'.join(['spots', 'output rows', 'current [s]', 'reference [s]', 'speedup', 'identical']))
+        for spots in args.spots:
+            data_folder = os.path.join(work_dir, 'spots%d' % spots)
+            synthetic_plates.write_screen(data_folder, nuclei=args.nuclei, spots=spots)
+
+            out_file = os.path.join(work_dir, 'current%d.tsv' % spots)
+            current, memory = run(SCRIPT, data_folder, out_file, [])
+            with open(out_file) as f:
+                rows = sum(1 for line in f) - 1
+
+            line = [str(spots), str(rows), '%.2f' % current]
+            if args.reference is not None:
+                reference_file = os.path.join(work_dir, 'reference%d.tsv' % spots)
+                reference, memory = run(args.reference, data_folder, reference_file, [])
+                line += ['%.2f' % reference, '%.1fx' % (reference / current), str(filecmp.cmp(out_file, reference_file, shallow=False))]
+            print('\t'.join(line))
+    finally:
+        shutil.rmtree(work_dir)
@@ -0,0 +1,186 @@
+################
+# benchmark suite of unite_data_v3.py: run a set of scenarios on synthetic screens and record runtime, peak memory and output size
+# a scenario is a screen written by synthetic_plates.py together with the options of the merge
+# --revisions runs every scenario with other git revisions of the tool as well, and checks they write the same table
+#   python tool/benchmarks/bench_suite.py --revisions HEAD~5 worktree --save results.json
+#   python tool/benchmarks/bench_suite.py --compare results.json
+# worktree is the checkout the suite is run from, options an older revision does not know mark its scenario as skipped
+# the other benchmarks and the checks in tool/checks run their merges with run() of this suite
+################
+
+import argparse
+import collections
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import synthetic_plates
+
+TOOL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+SCRIPT = os.path.join(TOOL_DIR, 'unite_data_v3.py')
+
+# name: (screen of synthetic_plates.write_screen(), options of the merge)
+SCENARIOS = collections.OrderedDict([
+    ('small',      (dict(plates=1, rows=2, columns=2, fields=2, nuclei=10, spots=3), [])),
+    ('plates',     (dict(plates=8, rows=2, columns=3, fields=2, nuclei=20, spots=3), [])),
+    ('nuclei',     (dict(plates=1, rows=4, columns=6, fields=4, nuclei=60, spots=2), [])),
+    ('spots',      (dict(plates=1, rows=2, columns=2, fields=2, nuclei=20, spots=10), [])),
+    ('vectorized', (dict(plates=1, rows=4, columns=6, fields=4, nuclei=60, spots=2), ['--engine', 'vectorized'])),
+    ('streaming',  (dict(plates=8, rows=2, columns=3, fields=2, nuclei=20, spots=3), ['--streaming'])),
+    ('jobs',       (dict(plates=8, rows=2, columns=3, fields=2, nuclei=20, spots=3), ['--jobs', '2'])),
+])
+
+
+def checkout(revision, work_dir):
+    ''' the unite_data_v3.py of a git revision, exported to work_dir, worktree is the one of this checkout '''
+
+    if revision == 'worktree':
+        return SCRIPT
+
+    target = os.path.join(work_dir, 'revision-' + hashlib.sha1(revision.encode('utf-8')).hexdigest()[:10])
+    if not os.path.isdir(target):
+        os.makedirs(target)
+        archive = subprocess.Popen(['git', 'archive', revision, '.'], cwd=TOOL_DIR, stdout=subprocess.PIPE)
+        subprocess.check_call(['tar', '-x', '-C', target], stdin=archive.stdout)
+        archive.stdout.close()
+        if archive.wait() != 0:
+            raise ValueError( "git archive failed for revision {0}".format(revision) )
+    return os.path.join(target, 'unite_data_v3.py')
+
+
+def known_options(script):
+    ''' the options in the --help of a revision of unite_data_v3.py '''
+
+    help_text = subprocess.check_output([sys.executable, script, '--help'], universal_newlines=True)
+    return set(word.strip('[],') for word in help_text.split() if word.startswith('--') or word.startswith('[--'))
+
+
+def run(script, data_folder, out_file, options, known=None):
+    '''
+    run one merge, returns the wall time in seconds and the peak memory of the merge and its worker processes in MB
+    the peak memory comes from wait4(), so it is measured the same way for every revision
+    revisions with the on-disk cache run with --no-cache, so every run reads its files and the user's cache stays untouched,
+    known are the known_options() of script, read from its --help, if not given
+    a failing merge writes its error output to stderr and raises CalledProcessError
+    '''
+
+    if known is None:
+        known = known_options(script)
+    if '--no-cache' in known and '--no-cache' not in options:
+        options = options + ['--no-cache']
+
+    with tempfile.TemporaryFile() as error_file:
+        start = time.time()
+        process = subprocess.Popen([sys.executable, script, '--data', data_folder, '--out', out_file] + options,
+                                   stdout=subprocess.DEVNULL, stderr=error_file)
+        pid, status, usage = os.wait4(process.pid, 0)
+        seconds = time.time() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode != 0:
+            error_file.seek(0)
+            sys.stderr.write( error_file.read().decode('utf-8', 'replace') )
+            raise subprocess.CalledProcessError(process.returncode, process.args)
+    return seconds, usage.ru_maxrss / 1024.0
+
+
+def file_md5(path):
+    key = hashlib.md5()
+    with open(path, 'rb') as in_file:
+        for block in iter(lambda: in_file.read(1 << 20), b''):
+            key.update(block)
+    return key.hexdigest()
+
+
+def run_scenario(script, known, data_folder, out_file, options, repeat):
+    ''' the result of the fastest of repeat runs of a scenario, None if the revision does not know one of its options '''
+
+    if any(option.startswith('--') and option not in known for option in options):
+        return None
+
+    runs = [run(script, data_folder, out_file, options, known) for i in range(repeat)]
+    seconds = min(seconds for seconds, memory in runs)
+    memory = max(memory for seconds, memory in runs)
+    return collections.OrderedDict([('seconds', round(seconds, 3)), ('peak_mb', round(memory, 1)),
+                                    ('output_mb', round(os.path.getsize(out_file) / 1024.0**2, 2)), ('md5', file_md5(out_file))])
+
+
+def print_results(results, revisions):
+    ''' one line per scenario and revision, times relative to the first revision '''
+
+    print('\t'.join(['scenario', 'revision', 'time [s]', 'speedup', 'peak [MB]', 'output [MB]', 'identical']))
+    for scenario, by_revision in results.items():
+        base = by_revision.get(revisions[0])
+        for revision in revisions:
+            result = by_revision.get(revision)
+            if result is None:
+                print('\t'.join([scenario, revision, 'skipped']))
+                continue
+            line = [scenario, revision, '%.2f' % result['seconds']]
+            if base is not None:
+                line += ['%.2fx' % (base['seconds'] / result['seconds']), '%.1f' % result['peak_mb'], '%.2f' % result['output_mb'], str(result['md5'] == base['md5'])]
+            else:
+                line += ['', '%.1f' % result['peak_mb'], '%.2f' % result['output_mb'], '']
+            print('\t'.join(line))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark unite_data_v3.py on synthetic screens, optionally across git revisions.')
+
+    parser.add_argument("--scenarios", dest='scenarios', type=str, nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS), help="Scenarios to run, all by default.")
+    parser.add_argument("--revisions", dest='revisions', type=str, nargs='+', default=['worktree'], help="git revisions of the tool to compare, worktree is this checkout. The first one is the baseline.")
+    parser.add_argument("--repeat",    dest='repeat', type=int, default=1, help="Runs per scenario and revision, the fastest counts.")
+    parser.add_argument("--scale",     dest='scale', type=float, default=None, help="Factor on the nuclei per field of every scenario, 1 or the one of --compare by default.")
+    parser.add_argument("--save",      dest='save', type=str, default=None, help="Write the results as JSON to this file.")
+    parser.add_argument("--compare",   dest='compare', type=str, default=None, help="JSON results of an earlier run, written with --save, to compare with. Its last revision is the baseline.")
+
+    args = parser.parse_args()
+
+    earlier = None
+    if args.compare is not None:
+        with open(args.compare) as compare_file:
+            earlier = json.load(compare_file)
+    # the screens of a comparison have to be of the same size
+    if args.scale is None:
+        args.scale = earlier['scale'] if earlier is not None else 1.0
+    work_dir = tempfile.mkdtemp()
+    results = collections.OrderedDict()
+    revisions = list(args.revisions)
+
+    try:
+        scripts = collections.OrderedDict( (revision, checkout(revision, work_dir)) for revision in revisions )
+        known = dict( (revision, known_options(script)) for revision, script in scripts.items() )
+
+        for scenario in args.scenarios:
+            screen, options = SCENARIOS[scenario]
+            screen = dict(screen, nuclei=max(1, int(round(screen['nuclei'] * args.scale))))
+            data_folder = os.path.join(work_dir, 'screen-%s' % scenario)
+            synthetic_plates.write_screen(data_folder, **screen)
+
+            results[scenario] = collections.OrderedDict()
+            for revision, script in scripts.items():
+                out_file = os.path.join(work_dir, 'out.tsv')
+                results[scenario][revision] = run_scenario(script, known[revision], data_folder, out_file, options, args.repeat)
+            shutil.rmtree(data_folder)
+    finally:
+        shutil.rmtree(work_dir)
+
+    # an earlier run takes the place of the baseline
+    if earlier is not None:
+        label = 'saved:' + os.path.basename(args.compare)
+        for scenario in results:
+            saved = earlier['results'].get(scenario, {})
+            if saved:
+                results[scenario][label] = saved[list(saved)[-1]]
+                results[scenario].move_to_end(label, last=False)
+        revisions.insert(0, label)
+
+    print_results(results, revisions)
+
+    if args.save is not None:
+        with open(args.save, 'w') as save_file:
+            json.dump({'scale': args.scale, 'repeat': args.repeat, 'results': results}, save_file, indent=2)
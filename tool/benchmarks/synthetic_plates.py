@@ -0,0 +1,153 @@
+################
+# write synthetic image analysis output that looks like a Harmony/Columbus export, so unite_data_v3.py can be benchmarked without real screens
+# every plate becomes one Measurement folder with an Evaluation subfolder containing the Nuclei Selected, spot and Spot Pairs tables
+#
+# call: python tool/benchmarks/synthetic_plates.py --out synthetic_data --plates 2 --nuclei 20 --spots 4
+################
+
+import argparse
+import os
+import random
+
+# pair files and the colors they combine, color abbreviations as used in the file names
+PAIRS = [('GR', 'green', 'red'), ('GFR', 'green', 'FarRed'), ('RFR', 'red', 'FarRed')]
+COLORS = ['green', 'red', 'FarRed']
+
+SPOT_FEATURES = ['Spot Area [px^2]', 'Uncorrected Spot Peak Intensity', 'Spot Contrast', 'Spot Background Intensity',
+                 'Corrected Spot Intensity', 'Relative Spot Intensity', 'Spot to Region Intensity', 'Region Intensity', 'Spot Score']
+NUCLEUS_FEATURES = ['Nucleus Area [px^2]', 'Nucleus Roundness', 'Intensity Nucleus DAPI Mean',
+                    'Number of green spots', 'Number of red spots', 'Number of FarRed spots']
+
+
+def preamble(plate, population):
+    ''' the lines preceding [Data] in every Objects_Population file '''
+    return ['[General]', 'Version\t1.0', 'Plate Name\t%s' % plate, 'Measurement\tMeasurement 1',
+            'Evaluation\tEvaluation1', 'Population\t%s' % population, '[Data]']
+
+
+def bounding_box(rng, size):
+    x = rng.randint(0, 1000)
+    y = rng.randint(0, 1000)
+    return '[%d,%d,%d,%d]' % (x, y, x + size, y + size)
+
+
+def pair_columns(color):
+    ''' the pair types a spot color takes part in, together with its position (1 or 2) in that pair '''
+    columns = list()
+    for abbreviation, color1, color2 in PAIRS:
+        if color == color1:
+            columns.append((abbreviation, 1))
+        elif color == color2:
+            columns.append((abbreviation, 2))
+    return columns
+
+
+def write_plate(folder, plate, rows=2, columns=2, fields=2, nuclei=10, spots=3, seed=0):
+    '''
+    write the Objects_Population tables of one plate into folder
+
+    spots is the mean number of spots per color and nucleus, the actual count is drawn between 0 and 2*spots
+    every spot of one color is paired with every spot of the partner color of the same nucleus
+    '''
+    rng = random.Random(seed)
+
+    nucleus_lines = preamble(plate, 'Nuclei Selected')
+    # line.strip() in unite_data_v3.py drops trailing empty cells, so every table ends on a filled column
+    nucleus_lines.append('\t'.join(['Row', 'Column', 'Timepoint', 'Field', 'Object No', 'X', 'Y', 'Bounding Box',
+                                    'Compound', 'Concentration', 'Cell Type', 'Cell Count'] +
+                                   ['Nuclei Selected - %s' % f for f in NUCLEUS_FEATURES]))
+
+    spot_lines = dict()
+    for color in COLORS:
+        header = ['Row', 'Column', 'Timepoint', 'Field', 'Object No', 'X', 'Y', 'Bounding Box']
+        header += ['%s spots - %s' % (color, f) for f in SPOT_FEATURES]
+        header += ['Compound', 'Concentration', 'Cell Type']
+        # column 20 has to be a nucleus index, it is used to link the spot to its nucleus
+        for abbreviation, position in pair_columns(color):
+            header += ['%s spots - %s_NucIndex' % (color, abbreviation), '%s spots - %s_Spot%dIndex' % (color, abbreviation, position)]
+        spot_lines[color] = preamble(plate, '%s spots' % color) + ['\t'.join(header)]
+
+    pair_lines = dict()
+    for abbreviation, color1, color2 in PAIRS:
+        # the pair population is named without a space, e.g. GRSpot Pairs
+        header = ['Row', 'Column', 'Timepoint', 'Field', 'X', 'Y', 'Bounding Box',
+                  '%sSpot Pairs - Distance [px]' % abbreviation, '%sSpot Pairs - Distance [um]' % abbreviation,
+                  'Compound', 'Concentration', 'Cell Type', 'Cell Count', 'Object No',
+                  '%sSpot Pairs - %s_NucIndex' % (abbreviation, abbreviation),
+                  '%sSpot Pairs - %s_Spot1Index' % (abbreviation, abbreviation),
+                  '%sSpot Pairs - %s_Spot2Index' % (abbreviation, abbreviation)]
+        pair_lines[abbreviation] = preamble(plate, '%sSpot Pairs' % abbreviation) + ['\t'.join(header)]
+
+    for row in range(1, rows + 1):
+        for column in range(1, columns + 1):
+            for field in range(1, fields + 1):
+                well = [str(row), str(column), '0', str(field)]
+                spot_object = dict((color, 0) for color in COLORS)
+                pair_object = dict((p[0], 0) for p in PAIRS)
+
+                for nucleus in range(1, nuclei + 1):
+                    counts = dict((color, rng.randint(0, 2 * spots)) for color in COLORS)
+                    nucleus_lines.append('\t'.join(well + [str(nucleus), str(rng.randint(0, 1000)), str(rng.randint(0, 1000)), bounding_box(rng, 30),
+                                                           '', '', '', '', str(rng.randint(400, 900)), '%.4f' % rng.random(), '%.2f' % rng.uniform(500, 3000),
+                                                           str(counts['green']), str(counts['red']), str(counts['FarRed'])]))
+
+                    for color in COLORS:
+                        for spot in range(1, counts[color] + 1):
+                            spot_object[color] += 1
+                            line = well + [str(spot_object[color]), str(rng.randint(0, 1000)), str(rng.randint(0, 1000)), bounding_box(rng, 8)]
+                            line += ['%.3f' % rng.uniform(1, 500) for f in SPOT_FEATURES]
+                            line += ['', '', '']
+                            for abbreviation, position in pair_columns(color):
+                                line += [str(nucleus), str(spot)]
+                            spot_lines[color].append('\t'.join(line))
+
+                    for abbreviation, color1, color2 in PAIRS:
+                        for spot1 in range(1, counts[color1] + 1):
+                            for spot2 in range(1, counts[color2] + 1):
+                                pair_object[abbreviation] += 1
+                                distance = rng.uniform(0, 40)
+                                pair_lines[abbreviation].append('\t'.join(well + [str(rng.randint(0, 1000)), str(rng.randint(0, 1000)), bounding_box(rng, 20),
+                                                                                  '%.3f' % distance, '%.4f' % (distance * 0.1), '', '', '', '',
+                                                                                  str(pair_object[abbreviation]), str(nucleus), str(spot1), str(spot2)]))
+
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+
+    tables = [('Nuclei Selected', nucleus_lines)]
+    tables += [('%s spots' % color, spot_lines[color]) for color in COLORS]
+    tables += [('%sSpot Pairs' % p[0], pair_lines[p[0]]) for p in PAIRS]
+    for population, lines in tables:
+        with open(os.path.join(folder, 'Objects_Population - %s.txt' % population), 'w') as out_file:
+            out_file.write('\n'.join(lines) + '\n')
+
+
+def write_screen(out_folder, plates=1, seed=0, **plate_options):
+    '''
+    write a whole screen: one Measurement folder per plate, each containing an Evaluation1 folder
+
+    returns the list of Evaluation folders
+    '''
+    folders = list()
+    for plate in range(1, plates + 1):
+        plate_name = 'SyntheticPlate%d' % plate
+        folder = os.path.join(out_folder, '%s__2016-01-09T15_55_35-Measurement1' % plate_name, 'Evaluation1')
+        write_plate(folder, plate_name, seed=seed + plate, **plate_options)
+        folders.append(folder)
+    return folders
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='write synthetic Harmony/Columbus style image analysis output.')
+
+    parser.add_argument("--out",     dest='out_folder', type=str, required=True, help="The folder to write the synthetic screen to.")
+    parser.add_argument("--plates",  dest='plates',  type=int, default=1,  help="Number of plates (Measurement folders).")
+    parser.add_argument("--rows",    dest='rows',    type=int, default=2,  help="Number of well rows per plate.")
+    parser.add_argument("--columns", dest='columns', type=int, default=2,  help="Number of well columns per plate.")
+    parser.add_argument("--fields",  dest='fields',  type=int, default=2,  help="Number of fields per well.")
+    parser.add_argument("--nuclei",  dest='nuclei',  type=int, default=10, help="Number of selected nuclei per field.")
+    parser.add_argument("--spots",   dest='spots',   type=int, default=3,  help="Mean number of spots per color and nucleus.")
+    parser.add_argument("--seed",    dest='seed',    type=int, default=0,  help="Seed of the random number generator.")
+
+    args = parser.parse_args()
+    write_screen(args.out_folder, plates=args.plates, seed=args.seed, rows=args.rows, columns=args.columns,
+                 fields=args.fields, nuclei=args.nuclei, spots=args.spots)
@@ -0,0 +1,96 @@
+################
+# check the merge daemon on a synthetic screen: a failing job reports its error and the jobs after it still run,
+# also with a single worker, whose dispatcher has to survive the failure, and after its worker process was killed,
+# a bad --where is refused on submit and a zip upload submitted twice is merged once
+#   python tool/checks/check_daemon.py
+################
+
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+
+# the synthetic screens and the tool folder of the benchmarks
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'benchmarks'))
+import synthetic_plates
+from bench_suite import TOOL_DIR
+
+sys.path.insert(0, TOOL_DIR)
+from unite_data.daemon import MergeDaemon
+
+
+def wait(daemon, job_id, timeout=120):
+    ''' the job once it is done or failed '''
+    end = time.time() + timeout
+    while time.time() < end:
+        job = daemon.status(job_id)
+        if job['state'] in ['done', 'failed']:
+            return job
+        time.sleep(0.1)
+    raise AssertionError( "job {0} is still {1} after {2} s".format(job_id, job['state'], timeout) )
+
+
+if __name__ == '__main__':
+    work_dir = tempfile.mkdtemp()
+    daemon = None
+
+    try:
+        data_folder = os.path.join(work_dir, 'screen')
+        synthetic_plates.write_screen(data_folder, plates=1, nuclei=5, spots=2)
+        daemon = MergeDaemon(workers=1, results_dir=os.path.join(work_dir, 'results'), cache_dir=None)
+
+        # more failing jobs than workers, every one of them used to stop a dispatcher for good
+        empty_folder = os.path.join(work_dir, 'empty')
+        os.makedirs(empty_folder)
+        for i in range(2):
+            failed = wait(daemon, daemon.submit({'data': empty_folder})['id'])
+            assert failed['state'] == 'failed', failed
+            assert failed['error'] and 'nucleus' in failed['error'], failed
+            print('failing job %s: %s' % (failed['id'], failed['error']))
+
+        done = wait(daemon, daemon.submit({'data': data_folder})['id'])
+        assert done['state'] == 'done' and os.path.getsize(done['out']) > 0, done
+        print('next job %s: %s' % (done['id'], done['state']))
+
+        try:
+            daemon.submit({'data': data_folder, 'where': ['bogus']})
+        except ValueError as error:
+            print('refused on submit: %s' % error)
+        else:
+            raise AssertionError( "a job with --where bogus was queued" )
+
+        # a worker killed during a job, as by the OOM killer, fails that job but not the ones after it
+        large_folder = os.path.join(work_dir, 'large')
+        synthetic_plates.write_screen(large_folder, plates=4, rows=4, columns=6, fields=4, nuclei=60, spots=3)
+        job_id = daemon.submit({'data': large_folder})['id']
+        end = time.time() + 120
+        while not (daemon.status(job_id)['state'] == 'running' and daemon.executor._processes) and time.time() < end:
+            time.sleep(0.05)
+        time.sleep(0.5)
+        for pid in list(daemon.executor._processes):
+            os.kill(pid, signal.SIGKILL)
+        killed = wait(daemon, job_id)
+        assert killed['state'] == 'failed' and 'BrokenProcessPool' in killed['error'], killed
+        print('killed job %s: %s' % (killed['id'], killed['error']))
+
+        done = wait(daemon, daemon.submit({'data': data_folder, 'streaming': True})['id'])
+        assert done['state'] == 'done' and os.path.getsize(done['out']) > 0, done
+        print('job after the killed worker %s: %s' % (done['id'], done['state']))
+
+        # uploads are deduplicated by their central directory, a changed member makes a new job
+        archive = shutil.make_archive(os.path.join(work_dir, 'upload'), 'zip', work_dir, 'screen')
+        first = daemon.submit({'data': archive})
+        assert daemon.submit({'data': archive})['id'] == first['id']
+        wait(daemon, first['id'])
+        synthetic_plates.write_screen(data_folder, plates=1, nuclei=6, spots=2)
+        archive = shutil.make_archive(os.path.join(work_dir, 'upload'), 'zip', work_dir, 'screen')
+        changed = wait(daemon, daemon.submit({'data': archive})['id'])
+        assert changed['id'] != first['id'] and changed['state'] == 'done', changed
+        print('zip upload jobs %s and %s' % (first['id'], changed['id']))
+        print('ok')
+    finally:
+        if daemon is not None:
+            daemon.close()
+        shutil.rmtree(work_dir)
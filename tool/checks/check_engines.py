@@ -0,0 +1,65 @@
+################
+# check that --engine python and --engine vectorized write byte identical tables on synthetic screens:
+# every case is merged by both engines and the md5 of their tables compared, the screen has a folder whose
+# spot pair and spot tables hold only their header and a folder whose tables all do
+#   python tool/checks/check_engines.py
+################
+
+import os
+import shutil
+import sys
+import tempfile
+
+# the synthetic screens and the merge runner of the benchmarks
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'benchmarks'))
+import synthetic_plates
+from bench_suite import SCRIPT, run, file_md5
+
+# name: options of the merge, run with both engines
+CASES = [
+    ('default',   []),
+    ('streaming', ['--streaming']),
+    ('jobs',      ['--jobs', '2']),
+    ('columns',   ['--columns', 'Nuclei Selected - *', 'Distance - Distance*']),
+    ('where',     ['--where', 'field=1', 'row=1-2']),
+    ('selection', ['--streaming', '--columns', 'Spot Area*', 'X', '--where', 'column=2']),
+]
+
+
+def empty_tables(folder, populations):
+    ''' cut the Objects_Population tables of folder to their preamble and header line '''
+
+    for population in populations:
+        path = os.path.join(folder, 'Objects_Population - %s.txt' % population)
+        with open(path) as in_file:
+            lines = in_file.read().split('\n')
+        header = lines.index('[Data]') + 1
+        with open(path, 'w') as out_file:
+            out_file.write('\n'.join(lines[:header + 1]) + '\n')
+
+
+if __name__ == '__main__':
+    work_dir = tempfile.mkdtemp()
+    failed = list()
+
+    try:
+        data_folder = os.path.join(work_dir, 'screen')
+        folders = synthetic_plates.write_screen(data_folder, plates=4, rows=2, columns=3, fields=2, nuclei=15, spots=3)
+        empty_tables(folders[1], ['GRSpot Pairs', 'GFRSpot Pairs', 'RFRSpot Pairs', 'red spots'])
+        empty_tables(folders[2], ['Nuclei Selected', 'green spots', 'red spots', 'FarRed spots', 'GRSpot Pairs', 'GFRSpot Pairs', 'RFRSpot Pairs'])
+
+        for name, options in CASES:
+            md5 = dict()
+            for engine in ['python', 'vectorized']:
+                out_file = os.path.join(work_dir, '%s-%s.tsv' % (name, engine))
+                run(SCRIPT, data_folder, out_file, options + ['--engine', engine])
+                md5[engine] = file_md5(out_file)
+            print('\t'.join([name, md5['python'], md5['vectorized'], 'identical' if md5['python'] == md5['vectorized'] else 'DIFFERENT']))
+            if md5['python'] != md5['vectorized']:
+                failed.append(name)
+    finally:
+        shutil.rmtree(work_dir)
+
+    if failed:
+        sys.exit( "the engines write different tables for: {0}".format(', '.join(failed)) )
+    print('ok')
@@ -0,0 +1,8 @@
+################
+# merge the nuclei, spot and spot pair tables of Harmony/Columbus image analysis output into one table per screen
+# unite() writes the table like unite_data_v3.py does, unite_rows() yields its lines to a long running process
+################
+
+from .api import unite, unite_rows, merge_batches
+from .cache import MeasurementCache
+from .inputs import find_data
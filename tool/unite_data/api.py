@@ -0,0 +1,286 @@
+################
+# merge a whole screen, the functions behind the command line tool for use from a long running process, e.g.
+#   import unite_data
+#   unite_data.unite('screen.zip', 'fused_file.tsv', jobs=4)
+#   for row in unite_data.unite_rows('screen_folder'):
+#       ...
+################
+
+import collections
+import multiprocessing
+import sys
+import time
+
+from .cache import MeasurementCache
+from .inputs import find_data
+from .merge import read_measurement, merged_lines, merged_cells, output_header
+from .output import open_output
+from .profile import StageProfile, profile_summary
+from .selection import Selection
+from .summary import SummaryTables
+from .vectorized import read_measurement_frame, fold_frames, frame_lines
+
+
+def read_measurement_folder(file_name_set, cache=None, engine='python', typed=False, selection=None):
+    '''
+    read one measurement folder into its own containers, this is the unit of work of the process pool
+    with a MeasurementCache unchanged folders are served from the cache, typed and the Selection selection are passed on to the reader
+    returns (selected_data, auxilary_data, profile), with engine='vectorized' (frame, auxilary_data, profile) of read_measurement_frame()
+    profile is the StageProfile of this folder
+    '''
+    
+    profile = StageProfile()
+    
+    if cache is not None:
+        measurement = cache.load(file_name_set)
+        profile.lap('cache')
+        if measurement is not None:
+            return measurement + (profile,)
+    
+    if engine == 'vectorized':
+        auxilary_data = dict()
+        measurement = (read_measurement_frame(file_name_set, auxilary_data, profile, selection), auxilary_data)
+    else:
+        measurement = (collections.OrderedDict(), dict())
+        read_measurement(file_name_set, measurement[0], measurement[1], profile, typed, selection)
+    
+    if cache is not None:
+        profile.start()
+        cache.store(file_name_set, measurement)
+        profile.lap('cache')
+    return measurement + (profile,)
+
+
+def read_measurements(infiles, jobs=1, cache=None, engine='python', progress=None, typed=False, selection=None):
+    '''
+    yield the result of read_measurement_folder() for every measurement folder in input order
+    progress is called with the number of folders read so far and the number of all folders, first before any folder is read
+    '''
+    
+    if progress is not None:
+        progress(0, len(infiles))
+    
+    for done, measurement in enumerate(read_folders(infiles, jobs, cache, engine, typed, selection), 1):
+        if progress is not None:
+            progress(done, len(infiles))
+        yield measurement
+
+
+def read_folders(infiles, jobs=1, cache=None, engine='python', typed=False, selection=None):
+    '''
+    the folders of read_measurements() in input order
+    with jobs > 1 the folders are read by a process pool, at most 2*jobs folders are read ahead of the consumer
+    '''
+    
+    if jobs <= 1:
+        for file_name_set in infiles:
+            yield read_measurement_folder(file_name_set, cache, engine, typed, selection)
+        return
+    
+    pool = multiprocessing.Pool(processes=jobs)
+    try:
+        queued = collections.deque()
+        for file_name_set in infiles:
+            queued.append( pool.apply_async(read_measurement_folder, (file_name_set, cache, engine, typed, selection)) )
+            if len(queued) >= 2*jobs:
+                yield queued.popleft().get()
+        while queued:
+            yield queued.popleft().get()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def merge_batches(infiles, auxilary_data, jobs=1, cache=None, engine='python', streaming=False, profile=None, progress=None, typed=False, selection=None,
+                  summaries=None):
+    '''
+    merge the measurement folders of infiles and yield the lines of the merged table in batches of tab separated strings,
+    with typed=True in batches of tuples of typed cells
+    auxilary_data is filled with the output header parts, they are complete when the first batch is yielded
+    with streaming every folder is a batch of its own, otherwise all folders are folded into a single batch
+    progress and the Selection selection are passed on to read_measurements()
+    the SummaryTables summaries, python engine only, get the records of every batch before it is yielded
+    '''
+    
+    if profile is None:
+        profile = StageProfile()
+    
+    if streaming:
+        # merge one measurement folder at a time and drop its data before reading the next one
+        # the header is taken from the first folders providing nuclei, spot and distance tables,
+        # folders read before the header is complete are kept until it is
+        header_missing = True
+        pending = list()
+        
+        for data, folder_header, folder_profile in read_measurements(infiles, jobs, cache, engine, progress, typed, selection):
+            
+            profile.add(folder_profile)
+            for key in folder_header:
+                auxilary_data.setdefault(key, folder_header[key])
+            pending.append(data)
+            del data
+            
+            if all(key in auxilary_data for key in ['nucleus', 'distance', 'spot']):
+                header_missing = False
+                
+                # release every folder as soon as it is written
+                while pending:
+                    if summaries is not None:
+                        profile.start()
+                        summaries.add(pending[0], auxilary_data)
+                        profile.lap('summary')
+
+                    if engine == 'vectorized':
+                        yield frame_lines(pending.pop(0), auxilary_data)
+                    elif typed:
+                        yield merged_cells(pending.pop(0), auxilary_data)
+                    else:
+                        yield merged_lines(pending.pop(0), auxilary_data)
+        
+        # a table type that was never found fails, when the header is written, just like in the default mode
+        if header_missing:
+            yield list()
+    
+    else:
+        # folders are read separately and folded in input order, which gives the same result as reading
+        # them one after another: a nucleus seen again in a later folder replaces the earlier one
+        if engine == 'vectorized':
+            frames = list()
+            for frame, folder_header, folder_profile in read_measurements(infiles, jobs, cache, engine, progress, typed, selection):
+                frames.append(frame)
+                auxilary_data.update(folder_header)
+                profile.add(folder_profile)
+            
+            profile.start()
+            lines = frame_lines(fold_frames(frames), auxilary_data)
+            profile.lap('join')
+            yield lines
+        else:
+            selected_data = collections.OrderedDict()
+            for measurement in read_measurements(infiles, jobs, cache, engine, progress, typed, selection):
+                selected_data.update(measurement[0])
+                auxilary_data.update(measurement[1])
+                profile.add(measurement[2])
+            
+            if summaries is not None:
+                profile.start()
+                summaries.add(selected_data, auxilary_data)
+                profile.lap('summary')
+            
+            # merged_lines() joins the records while they are written, so the join is part of the output stage
+            if typed:
+                yield merged_cells(selected_data, auxilary_data)
+            else:
+                yield merged_lines(selected_data, auxilary_data)
+
+
+def check_options(jobs, engine, typed=False, summaries=None):
+    ''' fail early on options the merge cannot run with '''
+    
+    if jobs < 1:
+        raise ValueError( "--jobs needs to be at least 1" )
+    
+    if typed and engine != 'python':
+        raise ValueError( "--typed is only available with --engine python" )
+    
+    if summaries is not None and engine != 'python':
+        raise ValueError( "--summaries is only available with --engine python" )
+    
+    if engine == 'vectorized':
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError( "--engine vectorized needs the pandas package" )
+
+
+def open_cache(path, cache_dir, cache_size, cache_content, engine, typed=False, selection=None):
+    ''' the MeasurementCache for the data in path, None without cache_dir or when cache_dir cannot be created '''
+    
+    if cache_dir is None:
+        return None
+    # typed records and records of a selection are cached apart from the full string records of the same engine
+    variant = engine + (' typed' if typed else '') + (selection.key() if selection is not None else '')
+    try:
+        return MeasurementCache(cache_dir, cache_size * 1024**2, path, content_key=cache_content, engine=variant)
+    except OSError as error:
+        # the cache is on by default, so a cache folder that is not writable must not fail the merge
+        sys.stderr.write( "merging without the cache: {0}\n".format(error) )
+        return None
+
+
+def unite_rows(path, jobs=1, engine='python', streaming=False, cache_dir=None, cache_size=2048, cache_content=False, manifest=None, typed=False,
+               columns=None, where=None):
+    '''
+    the generator API of unite(): yield the column names of the merged table of path first, then every line as list of cells
+    with typed=True the cells are int, float, string or None for missing values, see typed.py
+    '''
+    
+    infiles = find_data(path, jobs, manifest)
+    check_options(jobs, engine, typed)
+    selection = Selection(columns, where)
+    cache = open_cache(path, cache_dir, cache_size, cache_content, engine, typed, selection)
+    
+    auxilary_data = dict()
+    header_missing = True
+    for batch in merge_batches(infiles, auxilary_data, jobs, cache, engine, streaming, typed=typed, selection=selection):
+        if header_missing:
+            yield output_header(auxilary_data)
+            header_missing = False
+        for line in batch:
+            yield list(line) if typed else line.split('\t')
+    
+    if cache is not None:
+        cache.evict()
+
+
+def unite(path, out, format='tsv', jobs=1, engine='python', streaming=False, cache_dir=None, cache_size=2048, cache_content=False, progress=None, compression=None, manifest=None, typed=False,
+          columns=None, where=None, summaries=None):
+    '''
+    merge the image analysis output in path, a data folder or a zip archive of it, into the table out
+    the options are those of unite_data_v3.py, cache_dir=None reads every measurement folder from its files
+    compression is None, 'gzip' or 'zstd' for tab separated output, manifest lists the Objects files instead of walking path
+    typed=True parses the cells to numbers and splits bounding boxes, see typed.py
+    columns are glob patterns on the output column names and where filters like field=1-4, see selection.py
+    summaries is the path prefix of the summary tables written next to out, see summary.py
+    progress is called with the number of measurement folders read and the number of all folders
+    returns the --profile summary of the run
+    '''
+    
+    start_time = time.perf_counter()
+    profile = StageProfile()
+    
+    infiles = find_data(path, jobs, manifest)
+    profile.count('discovery', len(infiles))
+    profile.lap('discovery')
+    
+    check_options(jobs, engine, typed, summaries)
+    selection = Selection(columns, where)
+    cache = open_cache(path, cache_dir, cache_size, cache_content, engine, typed, selection)
+    output = open_output(out, format, compression)
+    summary_tables = SummaryTables(summaries) if summaries is not None else None
+    
+    auxilary_data = dict()
+    header_missing = True
+    write = output.write_rows if typed else output.write_lines
+    for batch in merge_batches(infiles, auxilary_data, jobs, cache, engine, streaming, profile, progress, typed, selection, summary_tables):
+        profile.start()
+        if header_missing:
+            output.write_header(auxilary_data)
+            header_missing = False
+        profile.count('output', write(batch))
+        profile.lap('output')
+    
+    profile.start()
+    output.close()
+    profile.lap('output')
+    
+    if summary_tables is not None:
+        summary_tables.close()
+        profile.count('summary', summary_tables.nucleus_count)
+        profile.lap('summary')
+    
+    if cache is not None:
+        cache.evict()
+    
+    return profile_summary(profile, time.perf_counter() - start_time, data=path, engine=engine, jobs=jobs, streaming=streaming, typed=typed, folders=len(infiles))
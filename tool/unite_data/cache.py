@@ -0,0 +1,149 @@
+################
+# on-disk cache of merged measurement folders
+################
+
+import gc
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+from .inputs import ZipPath
+
+# the cache of the command line tool
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'unite_data')
+
+
+class MeasurementCache(object):
+    '''
+    on-disk cache of read_measurement_folder() results, one pickle file per measurement folder
+    
+    an entry is keyed by the Objects files of its folder: their path relative to the data folder together with
+    their size and mtime, or their content with content_key=True, so an unzipped copy of the same upload is found again
+    files in zip archives are always keyed by their size and the CRC of their content
+    entries are also keyed by the source of this package and by the merge engine, so changes to the parsing never serve outdated records
+    the least recently used entries are removed, when the cache grows beyond max_size bytes
+    the cache never fails a merge: raises OSError only, when cache_dir cannot be created, and a failed store() or evict() is skipped
+    '''
+    
+    def __init__(self, cache_dir, max_size, data_folder, content_key=False, engine='python'):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.data_folder = data_folder
+        self.content_key = content_key
+        self.warned = False
+        
+        code_version = hashlib.sha1(engine.encode('utf-8'))
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        for source_file in sorted(os.listdir(package_dir)):
+            if source_file.endswith('.py'):
+                with open(os.path.join(package_dir, source_file), 'rb') as source:
+                    code_version.update(source.read())
+        self.code_version = code_version.hexdigest()
+        
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def warn(self, error):
+        ''' tell about the first failed write of this process on stderr, a full disk would fail every folder the same way '''
+        
+        if not self.warned:
+            sys.stderr.write( "cache {0} is not written: {1}\n".format(self.cache_dir, error) )
+            self.warned = True
+    
+    def path(self, file_name_set):
+        key = hashlib.sha1(self.code_version.encode('utf-8'))
+        
+        for file_name in file_name_set:
+            key.update(os.path.relpath(file_name, self.data_folder).encode('utf-8'))
+            if isinstance(file_name, ZipPath):
+                key.update( ('%d %d' % (file_name.size, file_name.crc)).encode('utf-8') )
+            elif self.content_key:
+                with open(file_name, 'rb') as in_file:
+                    for block in iter(lambda: in_file.read(1 << 20), b''):
+                        key.update(block)
+            else:
+                stat = os.stat(file_name)
+                key.update( ('%d %d' % (stat.st_size, stat.st_mtime_ns)).encode('utf-8') )
+        
+        return os.path.join(self.cache_dir, key.hexdigest() + '.pickle')
+    
+    def load(self, file_name_set):
+        ''' the cached measurement or None '''
+        
+        path = self.path(file_name_set)
+        # the garbage collector would scan the millions of new records over and over while unpickling
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(path, 'rb') as cache_file:
+                measurement = pickle.load(cache_file)
+        # a missing or unreadable entry is read again from the Objects files
+        except Exception:
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+        
+        # mark the entry as recently used, another process may have evicted it meanwhile or the cache may be read-only
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return measurement
+    
+    def store(self, file_name_set, measurement):
+        ''' write an entry, other processes never see it half written and a failed write, e.g. on a full disk, leaves no file behind '''
+        
+        temp_path = None
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            handle, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(handle, 'wb') as cache_file:
+                pickle.dump(measurement, cache_file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.path(file_name_set))
+        except Exception as error:
+            self.warn(error)
+            if temp_path is not None:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+        finally:
+            if gc_enabled:
+                gc.enable()
+    
+    def evict(self):
+        '''
+        remove the least recently used entries, until the cache fits into max_size
+        entries removed by another process sharing the cache meanwhile, e.g. a daemon job, and entries that cannot be removed are skipped
+        '''
+        
+        try:
+            file_names = os.listdir(self.cache_dir)
+        except OSError as error:
+            self.warn(error)
+            return
+        
+        entries = list()
+        for file_name in file_names:
+            if file_name.endswith('.pickle'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, file_name))
+                except OSError:
+                    continue
+                entries.append( (stat.st_mtime, stat.st_size, file_name) )
+        
+        cache_size = sum(entry[1] for entry in entries)
+        for mtime, size, file_name in sorted(entries):
+            if cache_size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except FileNotFoundError:
+                pass
+            except OSError as error:
+                self.warn(error)
+                continue
+            cache_size -= size
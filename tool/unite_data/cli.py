@@ -0,0 +1,84 @@
+################
+# command line interface of the unite_data package, called by unite_data_v3.py
+################
+
+import argparse
+import json
+import os
+
+from .api import unite
+from .cache import DEFAULT_CACHE_DIR
+from .inputs import find_input_files, write_manifest
+from .profile import print_profile
+
+
+def main(argv=None):
+    ''' run the merge with the command line options in argv, sys.argv by default '''
+    
+    parser = argparse.ArgumentParser(description='condense features related to the same gene to one start and end position.')
+    
+    parser.add_argument("--data", dest='in_folder', type=str, help="The data folder that contains the image analysis output, or a zip archive of it.")
+    parser.add_argument("--out",  dest='out_file',  type=str, help="The data output file.")
+    parser.add_argument("--format", dest='format', choices=['tsv', 'parquet', 'feather'], default='tsv', help="Format of the output file. parquet and feather store typed columns and need pyarrow.")
+    parser.add_argument("--compression", dest='compression', choices=['gzip', 'zstd'], default=None, help="Compress the tsv output file. zstd needs the zstandard package and is much faster than gzip.")
+    parser.add_argument("--manifest", dest='manifest', type=str, default=None, help="File listing the Objects files of --data, one per line relative to --data, so the data folder is not walked. Files of the same directory form one measurement folder.")
+    parser.add_argument("--write-manifest", dest='write_manifest', type=str, default=None, help="Walk --data, write the manifest of its Objects files to this file and exit without merging.")
+    parser.add_argument("--jobs", dest='jobs', type=int, default=1, help="Number of processes reading measurement folders in parallel, and of threads walking the top level folders of --data. The output is the same as with a single process.")
+    parser.add_argument("--cache-dir", dest='cache_dir', type=str, default=DEFAULT_CACHE_DIR, help="Folder of the cache of already merged measurement folders.")
+    parser.add_argument("--cache-size", dest='cache_size', type=int, default=2048, help="Size limit of the cache in MB, the least recently used folders are removed first.")
+    parser.add_argument("--cache-content", dest='cache_content', action='store_true', help="Recognise unchanged folders by the content of their files instead of size and modification time.")
+    parser.add_argument("--no-cache", dest='no_cache', action='store_true', help="Read every measurement folder from its files and leave the cache untouched.")
+    parser.add_argument("--engine", dest='engine', choices=['python', 'vectorized'], default='python', help="Merge with plain Python or with pandas, which loads every table in bulk. Both write the same output, neither is generally faster: the vectorized engine needs more memory and is not faster on the screens measured.")
+    parser.add_argument("--typed", dest='typed', action='store_true', help="Parse the cells to integer and decimal numbers while reading, the type of every column is inferred from the first rows of each table, and split bounding boxes like [114,69,122,86] into four integer columns. Only with --engine python.")
+    parser.add_argument("--columns", dest='columns', type=str, nargs='+', default=None, help="Keep only the output columns matching one of these glob patterns, e.g. 'Nuclei Selected - *' 'Distance - Distance*'. Spot columns are kept for both spots, the experiment and the spot colors are always kept.")
+    parser.add_argument("--where", dest='where', type=str, nargs='+', default=None, help="Keep only the rows matching all of these filters: experiment=NAME,..., row=, column=, timepoint= or field= with numbers and ranges like field=1,3-5.")
+    parser.add_argument("--summaries", dest='summaries', type=str, default=None, help="Also write summary tables to this path prefix: PREFIX.nuclei.tsv with the spots and distances per nucleus, and PREFIX.experiments.tsv with the mean, sd and approximate quantiles of those counts and of the spot pair distances per experiment. Only with --engine python.")
+    parser.add_argument("--streaming", dest='streaming', action='store_true', help="Merge and write one measurement folder at a time to keep memory bounded by the largest folder. Nuclei with the same Row/Column/Timepoint/Field/Object No in different folders are all written, instead of the last folder replacing the earlier ones.")
+    parser.add_argument("--profile", dest='profile', type=str, default=None, help="Print time and rows of every stage and the peak memory to stderr and write them as JSON to this file. With --jobs the reading stages add up the time of all processes.")
+    parser.add_argument("--daemon", dest='daemon', action='store_true', help="Instead of merging --data, serve merge jobs over HTTP on 127.0.0.1, see unite_data/daemon.py. --jobs, --engine and the cache options apply to every job.")
+    parser.add_argument("--port", dest='port', type=int, default=8765, help="Port of the --daemon.")
+    parser.add_argument("--workers", dest='workers', type=int, default=2, help="Number of merge jobs the --daemon runs at the same time, the others wait in its queue.")
+    parser.add_argument("--results-dir", dest='results_dir', type=str, default=None, help="Folder the --daemon writes merged tables to, a temporary folder by default.")
+    parser.add_argument("--profile-stats", dest='profile_stats', type=str, default=None, help="Write cProfile statistics of the main process to this file, e.g. for python -m pstats.")
+    
+    # initialise and read parameters
+    args = parser.parse_args(argv)
+    cache_dir = None if args.no_cache else args.cache_dir
+    
+    if args.daemon:
+        from .daemon import serve
+        serve(args.port, args.workers, args.results_dir, jobs=args.jobs, cache_dir=cache_dir, cache_size=args.cache_size, cache_content=args.cache_content)
+        return 0
+    
+    if args.write_manifest is not None:
+        if args.in_folder is None or not os.path.isdir(args.in_folder):
+            parser.error( "--write-manifest needs --data to be a data folder" )
+        write_manifest(args.write_manifest, args.in_folder, find_input_files(args.in_folder, args.jobs))
+        return 0
+    
+    if args.in_folder is None or args.out_file is None:
+        parser.error( "--data and --out are required" )
+    
+    if args.profile_stats is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    
+    try:
+        summary = unite(args.in_folder, args.out_file, format=args.format, jobs=args.jobs, engine=args.engine, streaming=args.streaming,
+                        cache_dir=cache_dir, cache_size=args.cache_size, cache_content=args.cache_content,
+                        compression=args.compression, manifest=args.manifest, typed=args.typed,
+                        columns=args.columns, where=args.where, summaries=args.summaries)
+    except (ValueError, ImportError) as error:
+        exit( str(error) )
+    
+    if args.profile_stats is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile_stats)
+    
+    if args.profile is not None:
+        print_profile(summary)
+        with open(args.profile, 'w') as profile_file:
+            json.dump(summary, profile_file, indent=2)
+    
+    return 0
@@ -0,0 +1,297 @@
+################
+# local merge daemon: merge jobs are posted as JSON over HTTP on 127.0.0.1 and run by a bounded pool of worker processes,
+# so Shiny sessions poll for their table instead of blocking on a python process of their own
+#   python unite_data_v3.py --daemon --port 8765 --workers 2
+#   POST /jobs       {"data": "/tmp/upload.zip", "format": "parquet", "priority": 0}  ->  the job
+#   GET  /jobs/<id>  the job: state queued, running, done or failed, progress, out and the --profile summary when done
+#   GET  /jobs       all jobs
+# jobs with a higher priority start first, jobs of the same priority in the order they were posted
+# a job for the same data and options as an earlier one, which is still queued, running or done, returns the earlier job
+################
+
+import collections
+import concurrent.futures
+import concurrent.futures.process
+import hashlib
+import http.server
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+
+from .api import unite
+from .selection import Selection
+
+# options a job may set, the other options of unite() are those of the daemon
+JOB_OPTIONS = {'format': 'tsv', 'engine': 'python', 'streaming': False, 'typed': False, 'columns': None, 'where': None}
+FORMAT_SUFFIX = {'tsv': '.tsv', 'parquet': '.parquet', 'feather': '.feather'}
+
+
+def data_fingerprint(path):
+    '''
+    the identity of the data in path for deduplication without reading it, so a submit returns right away also for large uploads:
+    the name, size and CRC of every member of a zip archive, read from its central directory like ZipPath does,
+    the relative path, size and mtime of every file in a data folder and of any other file
+    '''
+
+    key = hashlib.sha1()
+    if os.path.isdir(path):
+        for dirpath, dirnames, files in os.walk(path):
+            dirnames.sort()
+            for file_name in sorted(files):
+                file_path = os.path.join(dirpath, file_name)
+                stat = os.stat(file_path)
+                key.update( ('%s %d %d\n' % (os.path.relpath(file_path, path), stat.st_size, stat.st_mtime_ns)).encode('utf-8') )
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zip_file:
+            for info in zip_file.infolist():
+                key.update( ('%s %d %d\n' % (info.filename, info.file_size, info.CRC)).encode('utf-8') )
+    else:
+        stat = os.stat(path)
+        key.update( ('%s %d %d\n' % (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)).encode('utf-8') )
+    return key.hexdigest()
+
+
+def run_job(job_id, data, out, options, progress_queue):
+    ''' merge one job in a worker process, progress goes back to the daemon through progress_queue '''
+
+    def progress(done, folders):
+        progress_queue.put( (job_id, done, folders) )
+
+    return unite(data, out, progress=progress, **options)
+
+
+class MergeDaemon(object):
+    '''
+    the job queue and worker pool of the daemon, independent of the HTTP server
+    workers merges run at the same time in separate processes, unite_options are passed to every merge
+    results are written to results_dir, the oldest finished jobs are removed with their table beyond max_results
+    '''
+
+    def __init__(self, workers=2, results_dir=None, max_results=100, **unite_options):
+        self.results_dir = results_dir or tempfile.mkdtemp(prefix='unite_data_')
+        self.workers = workers
+        self.max_results = max_results
+        self.unite_options = unite_options
+
+        if not os.path.isdir(self.results_dir):
+            os.makedirs(self.results_dir)
+
+        self.lock = threading.Lock()
+        self.jobs = collections.OrderedDict()
+        self.by_key = dict()
+        self.queue = queue.PriorityQueue()
+        self.sequence = itertools.count()
+
+        self.manager = multiprocessing.Manager()
+        self.progress = self.manager.Queue()
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+
+        # one dispatcher per worker keeps at most workers jobs in the pool, the others wait in the priority queue
+        self.threads = [threading.Thread(target=self.dispatch) for i in range(workers)]
+        self.threads.append( threading.Thread(target=self.listen) )
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, request):
+        '''
+        queue a job for the request, a dict with data and the JOB_OPTIONS, or return the job for the same request
+        raises ValueError for a request the merge cannot run
+        '''
+
+        data = request.get('data')
+        if not isinstance(data, str) or not os.path.exists(data):
+            raise ValueError( "data:{0} is not a valid path".format(data) )
+
+        options = dict( (name, request.get(name, default)) for name, default in JOB_OPTIONS.items() )
+        if options['format'] not in FORMAT_SUFFIX:
+            raise ValueError( "format:{0} is not one of {1}".format(options['format'], ', '.join(sorted(FORMAT_SUFFIX))) )
+        if options['engine'] not in ['python', 'vectorized']:
+            raise ValueError( "engine:{0} is not python or vectorized".format(options['engine']) )
+        # a bad --where is refused here rather than failing the job later
+        Selection(options['columns'], options['where'])
+        priority = int(request.get('priority', 0))
+
+        key = hashlib.sha1( json.dumps([data_fingerprint(data), sorted(options.items())]).encode('utf-8') ).hexdigest()
+
+        with self.lock:
+            if key in self.by_key:
+                job = self.jobs[self.by_key[key]]
+                if job['state'] != 'failed' and (job['state'] != 'done' or os.path.exists(job['out'])):
+                    return dict(job)
+
+            job_id = '%d' % next(self.sequence)
+            job = collections.OrderedDict([
+                ('id', job_id),
+                ('state', 'queued'),
+                ('data', data),
+                ('out', os.path.join(self.results_dir, key + FORMAT_SUFFIX[options['format']])),
+                ('options', options),
+                ('priority', priority),
+                ('progress', collections.OrderedDict([('done', 0), ('folders', None)])),
+                ('submitted', time.time()),
+                ('started', None),
+                ('finished', None),
+                ('summary', None),
+                ('error', None),
+            ])
+            self.jobs[job_id] = job
+            self.by_key[key] = job_id
+            self.queue.put( (-priority, int(job_id), job_id) )
+            return dict(job)
+
+    def status(self, job_id=None):
+        ''' a copy of one job or of all jobs, None for an unknown job '''
+
+        with self.lock:
+            if job_id is None:
+                return [dict(job) for job in self.jobs.values()]
+            if job_id not in self.jobs:
+                return None
+            return dict(self.jobs[job_id])
+
+    def dispatch(self):
+        ''' run queued jobs one at a time on the worker pool, a job failing in any way fails alone and the dispatcher goes on '''
+
+        while True:
+            priority, sequence, job_id = self.queue.get()
+            try:
+                self.run(job_id)
+            except Exception as exc:
+                with self.lock:
+                    job = self.jobs.get(job_id)
+                    if job is not None and job['state'] != 'done':
+                        job['state'] = 'failed'
+                        job['error'] = '{0}: {1}'.format(type(exc).__name__, exc)
+                        job['finished'] = time.time()
+
+    def run(self, job_id):
+        with self.lock:
+            job = self.jobs[job_id]
+            job['state'] = 'running'
+            job['started'] = time.time()
+            options = dict(self.unite_options, **job['options'])
+            executor = self.executor
+
+        # the exception is not bound to error, Python deletes the name of an except clause at its end
+        try:
+            future = executor.submit(run_job, job_id, job['data'], job['out'], options, self.progress)
+            summary = future.result()
+        except concurrent.futures.process.BrokenProcessPool as exc:
+            # a worker process died, e.g. killed for its memory, the pool takes no further jobs and is replaced,
+            # once for all the jobs it took down
+            state, summary, error = 'failed', None, '{0}: {1}'.format(type(exc).__name__, exc)
+            with self.lock:
+                if self.executor is executor:
+                    self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+                    executor.shutdown(wait=False, cancel_futures=True)
+        except Exception as exc:
+            state, summary, error = 'failed', None, '{0}: {1}'.format(type(exc).__name__, exc)
+        else:
+            state, error = 'done', None
+
+        with self.lock:
+            job['state'] = state
+            job['summary'] = summary
+            job['error'] = error
+            job['finished'] = time.time()
+            self.evict()
+
+    def listen(self):
+        ''' move the progress reported by the workers to the jobs '''
+
+        while True:
+            # the queue goes away with the manager, when the daemon is closed
+            try:
+                job_id, done, folders = self.progress.get()
+            except (EOFError, OSError):
+                return
+            with self.lock:
+                # late reports of a job, which is already removed, are dropped
+                if job_id in self.jobs:
+                    self.jobs[job_id]['progress'] = collections.OrderedDict([('done', done), ('folders', folders)])
+
+    def evict(self):
+        ''' forget the oldest finished jobs and remove their tables, until max_results are left, called with the lock held '''
+
+        finished = [job for job in self.jobs.values() if job['state'] in ['done', 'failed']]
+        for job in finished[:max(0, len(finished) - self.max_results)]:
+            del self.jobs[job['id']]
+            for key, job_id in list(self.by_key.items()):
+                if job_id == job['id']:
+                    del self.by_key[key]
+            if os.path.exists(job['out']) and not any(other['out'] == job['out'] for other in self.jobs.values()):
+                os.remove(job['out'])
+
+    def close(self):
+        with self.lock:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.manager.shutdown()
+
+
+class DaemonHandler(http.server.BaseHTTPRequestHandler):
+    ''' the HTTP interface of the MergeDaemon in server.merge_daemon '''
+
+    def send_json(self, status, content):
+        body = json.dumps(content, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+
+        if parts == ['jobs']:
+            self.send_json(200, self.server.merge_daemon.status())
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = self.server.merge_daemon.status(parts[1])
+            if job is None:
+                self.send_json(404, {'error': 'no job {0}'.format(parts[1])})
+            else:
+                self.send_json(200, job)
+        else:
+            self.send_json(404, {'error': 'unknown path {0}'.format(self.path)})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            self.send_json(404, {'error': 'unknown path {0}'.format(self.path)})
+            return
+
+        try:
+            request = json.loads( self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8') )
+            job = self.server.merge_daemon.submit(request)
+        except (ValueError, TypeError, AttributeError) as error:
+            self.send_json(400, {'error': str(error)})
+            return
+        self.send_json(202, job)
+
+    def log_message(self, format, *args):
+        # requests are polled every second, so they are not logged
+        pass
+
+
+def serve(port=8765, workers=2, results_dir=None, max_results=100, **unite_options):
+    ''' run the daemon on 127.0.0.1:port until it is interrupted '''
+
+    daemon = MergeDaemon(workers, results_dir, max_results, **unite_options)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), DaemonHandler)
+    server.merge_daemon = daemon
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.close()
+        if results_dir is None:
+            shutil.rmtree(daemon.results_dir, ignore_errors=True)
@@ -0,0 +1,371 @@
+################
+# find the Objects files of the measurement folders in a data folder or a zip archive of it
+# every measurement folder becomes one list of Objects files, the unit the merge works on
+################
+
+import collections
+import concurrent.futures
+import io
+import itertools
+import locale
+import mmap
+import os
+import posixpath
+import zipfile
+
+
+def scan_folder(folder):
+    '''
+    the Objects files of folder and of every folder below it, one list per folder in the order of os.walk()
+    every folder is listed with a single os.scandir(), which already tells files and folders apart without a stat per entry
+    '''
+    
+    found = list()
+    
+    def scan(path):
+        files = list()
+        subfolders = list()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    
+                    # like os.walk() symbolic links to folders are not followed
+                    if is_dir:
+                        if not entry.is_symlink():
+                            subfolders.append(entry.path)
+                    elif entry.name.startswith('Objects'):
+                        files.append(entry.path)
+        # like os.walk() unreadable folders are skipped
+        except OSError:
+            return
+        
+        found.append(files)
+        for subfolder in subfolders:
+            scan(subfolder)
+    
+    scan(folder)
+    return found
+
+
+def find_input_files(in_folder, jobs=1):
+    '''
+    read folder content, which could be either files only or a complete folder structure with sub experiments
+    the top level folders are scanned by jobs threads in parallel, which pays off on network mounted screens
+    returns one list of Objects files per measurement folder
+    '''
+    
+    # earlier version of file opening, if only one input folder is used
+    # try:
+    #     temp_in_files = [ '/'.join([in_folder,f]) for f in os.listdir(in_folder) if os.path.isfile('/'.join([in_folder,f])) and f.startswith('Objects') ]
+    # except:
+    #     exit("Data folder contained no files")
+
+    # in_files = [ open(f) for f in temp_in_files ]
+
+    # read folder content, which could be either files only or a complete folder structure with sub experiments
+    # in listing order and without hidden entries like glob('*') did
+    with os.scandir(in_folder) as entries:
+        in_folder_struc = [ (os.path.join(in_folder, entry.name), entry.is_dir(), entry.is_file()) for entry in entries if not entry.name.startswith('.') ]
+    
+    folders = [ element for element, is_dir, is_file in in_folder_struc if is_dir ]
+    if jobs > 1 and len(folders) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            scanned = dict( zip(folders, executor.map(scan_folder, folders)) )
+    else:
+        scanned = dict( (folder, scan_folder(folder)) for folder in folders )
+    
+    temp_infiles = list()
+    sub_in_files = list()
+    is_files = False
+
+    for element, is_dir, is_file in in_folder_struc:
+    
+        # if only files are encountered
+        if is_file and os.path.basename(element).startswith('Objects'):
+            sub_in_files.append(element)
+            is_files = True
+    
+        # if whole folders are encountered
+        if is_dir:
+            is_files = False
+            for sub_in_files in scanned[element]:
+                temp_infiles.append(sub_in_files)
+
+    else:
+        if is_files is True:
+            temp_infiles.append(sub_in_files) # for single folders
+
+    # clean out empty elements that originate from subfolders
+    return [sublist for sublist in temp_infiles if len(sublist) > 0]
+
+
+def read_manifest(manifest, in_folder):
+    '''
+    the measurement folders listed in a manifest file instead of walking in_folder
+    the manifest has one Objects file per line, relative to in_folder or absolute, files of one folder form one measurement folder
+    empty lines and lines starting with # are skipped, the files are not checked before they are opened
+    '''
+    
+    folders = collections.OrderedDict()
+    with open(manifest) as manifest_file:
+        for line in manifest_file:
+            line = line.rstrip('\r\n')
+            if line.strip() == '' or line.startswith('#'):
+                continue
+            file_name = os.path.join(in_folder, line)
+            folders.setdefault(os.path.dirname(file_name), list()).append(file_name)
+    return list(folders.values())
+
+
+def write_manifest(manifest, in_folder, infiles):
+    ''' write the measurement folders infiles of in_folder as manifest file for read_manifest() '''
+    
+    with open(manifest, 'w') as manifest_file:
+        manifest_file.write( '# Objects files of {0}, one measurement folder per directory\n'.format(in_folder) )
+        for file_name_set in infiles:
+            for file_name in file_name_set:
+                manifest_file.write( os.path.relpath(file_name, in_folder) + '\n' )
+
+
+class ZipPath(str):
+    '''
+    an Objects file inside a zip archive, the string is the path the file would have after unzipping next to the archive
+    archive and member locate the file, size and crc fingerprint it for the MeasurementCache
+    '''
+    
+    def __new__(cls, archive, member, size, crc):
+        path = str.__new__(cls, os.path.join(archive, member))
+        path.archive = archive
+        path.member = member
+        path.size = size
+        path.crc = crc
+        return path
+    
+    def __reduce__(self):
+        return (ZipPath, (self.archive, self.member, self.size, self.crc))
+
+
+def find_zip_input_files(archive):
+    '''
+    the same as find_input_files() for a zip archive of the data folder, the archive is never extracted
+    returns one list of ZipPaths per measurement folder
+    '''
+    
+    with zipfile.ZipFile(archive) as zip_file:
+        infos = zip_file.infolist()
+    
+    # rebuild the folder tree in archive order, folders are often not stored as members of their own
+    folder_files = collections.OrderedDict()
+    subfolders = dict()
+    top_level = list()
+    
+    def add_folder(folder):
+        if folder in folder_files:
+            return
+        folder_files[folder] = list()
+        subfolders[folder] = list()
+        parent = posixpath.dirname(folder)
+        if parent == '':
+            top_level.append(folder)
+        else:
+            add_folder(parent)
+            subfolders[parent].append(folder)
+    
+    def walk(folder):
+        # top-down like os.walk
+        yield folder, folder_files[folder]
+        for subfolder in subfolders[folder]:
+            for entry in walk(subfolder):
+                yield entry
+    
+    for info in infos:
+        name = info.filename.rstrip('/')
+        if info.filename.endswith('/'):
+            add_folder(name)
+        elif posixpath.dirname(name) == '':
+            top_level.append(info)
+        else:
+            add_folder(posixpath.dirname(name))
+            folder_files[posixpath.dirname(name)].append(info)
+    
+    # from here on the same walk as in find_input_files(), glob('*') skips hidden top level entries
+    temp_infiles = list()
+    sub_in_files = list()
+    is_files = False
+    
+    for element in top_level:
+        
+        # if only files are encountered
+        if isinstance(element, zipfile.ZipInfo):
+            if element.filename.startswith('Objects'):
+                sub_in_files.append( ZipPath(archive, element.filename, element.file_size, element.CRC) )
+                is_files = True
+        
+        # if whole folders are encountered
+        elif not element.startswith('.'):
+            is_files = False
+            for dirpath, files in walk(element):
+                
+                sub_in_files = [ ZipPath(archive, info.filename, info.file_size, info.CRC) for info in files if posixpath.basename(info.filename).startswith('Objects') ]
+                temp_infiles.append(sub_in_files)
+    
+    else:
+        if is_files is True:
+            temp_infiles.append(sub_in_files) # for single folders
+    
+    # clean out empty elements that originate from subfolders
+    return [sublist for sublist in temp_infiles if len(sublist) > 0]
+
+
+# bytes of a memory mapped file, which are decoded and split into lines at once
+MAP_BLOCK_SIZE = 1 << 18
+
+
+def split_lines(text):
+    ''' the lines of text without their newline, a newline is LF, CR LF or CR like in a file opened as text '''
+    
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    lines = text.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    return lines
+
+
+class MappedLines(object):
+    '''
+    the text lines of a plain file read through a memory map of it, a replacement of open() for the large Objects files
+    preamble() jumps to a marker line like [Data] with a byte search in the map, the lines before it are the only ones split on the way
+    the lines after it are decoded and split a block of MAP_BLOCK_SIZE bytes at a time, only while they are iterated
+    lines come without their newline, ObjectsTable strips them anyway
+    '''
+    
+    def __init__(self, file_name):
+        self.encoding = locale.getpreferredencoding(False)
+        self.file = open(file_name, 'rb')
+        self.position = 0
+        try:
+            # an empty file cannot be mapped, it has no lines anyway
+            if os.fstat(self.file.fileno()).st_size > 0:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.map = b''
+        except:
+            self.file.close()
+            raise
+    
+    def preamble(self, marker):
+        '''
+        the lines before the first line starting with marker, white space aside, iteration then goes on after the marker line
+        returns None and skips nothing, if there is no such line
+        '''
+        
+        marker = marker.encode(self.encoding)
+        found = self.map.find(marker, self.position)
+        while found != -1:
+            line_start = max(self.map.rfind(b'\n', self.position, found), self.map.rfind(b'\r', self.position, found), self.position - 1) + 1
+            if self.map[line_start:found].decode(self.encoding).strip() == '':
+                break
+            found = self.map.find(marker, found + 1)
+        else:
+            return None
+        
+        # the marker line ends at the first \n or \r after the marker, \r\n counts as one newline
+        line_end = self.map.find(b'\n', found)
+        line_end = len(self.map) if line_end == -1 else line_end + 1
+        carriage_return = self.map.find(b'\r', found, line_end)
+        if carriage_return != -1 and self.map[carriage_return + 1:carriage_return + 2] != b'\n':
+            line_end = carriage_return + 1
+        
+        lines = split_lines( self.map[self.position:line_start].decode(self.encoding) )
+        self.position = line_end
+        return lines
+    
+    def blocks(self):
+        size = len(self.map)
+        while self.position < size:
+            # a block ends after a \n, so neither a line nor a character is split between two blocks
+            end = self.position + MAP_BLOCK_SIZE
+            if end < size:
+                newline = self.map.rfind(b'\n', self.position, end)
+                if newline == -1:
+                    newline = self.map.find(b'\n', end)
+                end = size if newline == -1 else newline + 1
+            else:
+                end = size
+            
+            text = self.map[self.position:end].decode(self.encoding)
+            self.position = end
+            yield split_lines(text)
+    
+    def __iter__(self):
+        return itertools.chain.from_iterable( self.blocks() )
+    
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
+
+
+class TableFiles(object):
+    '''
+    the Objects files of one measurement folder, opened one at a time while the merge reads them
+    open() returns the lines of a file and closes the file opened before, close() closes the last one and the zip archives,
+    so a folder never holds more than one file open, use it in a with statement to close them, when reading fails as well
+    plain files are read as MappedLines, members of zip archives from the archive, which is opened once per folder
+    '''
+    
+    def __init__(self, file_name_set):
+        self.file_name_set = file_name_set
+        self.archives = dict()
+        self.current = None
+    
+    def open(self, index):
+        self.close_current()
+        file_name = self.file_name_set[index]
+        if isinstance(file_name, ZipPath):
+            if file_name.archive not in self.archives:
+                self.archives[file_name.archive] = zipfile.ZipFile(file_name.archive)
+            self.current = io.TextIOWrapper(self.archives[file_name.archive].open(file_name.member))
+        else:
+            self.current = MappedLines(file_name)
+        return self.current
+    
+    def close_current(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+    
+    def close(self):
+        self.close_current()
+        for archive in self.archives.values():
+            archive.close()
+        self.archives = dict()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def find_data(path, jobs=1, manifest=None):
+    '''
+    the Objects files of every measurement folder in path, a data folder or a zip archive of it
+    a manifest file lists the files of a data folder, so the folder is not walked at all
+    raises ValueError for anything else
+    '''
+    
+    if os.path.isdir(path):
+        if manifest is not None:
+            return read_manifest(manifest, path)
+        return find_input_files(path, jobs)
+    elif zipfile.is_zipfile(path):
+        if manifest is not None:
+            raise ValueError( "--manifest only applies to data folders, {0} is a zip archive".format(path) )
+        return find_zip_input_files(path)
+    raise ValueError( "data folder:{0} is not a valid path".format(path) )
@@ -0,0 +1,481 @@
+################
+# merge the nuclei, spot and spot pair tables of a measurement folder
+# every selected nucleus becomes a Nucleus record holding its spots and distances,
+# merged_lines() then writes one line per distance of every nucleus
+################
+
+import collections
+import os
+import posixpath
+import re
+
+from .inputs import TableFiles, ZipPath
+from .objects_table import ObjectsTable, column_getter
+from .profile import StageProfile
+from .selection import Selection
+from .typed import typed_rows
+
+# records of the merged data, fields hold the cells of one table line in the column order of its file
+# spots and distances of a nucleus are OrderedDicts keyed by their IDs, spot_index maps distance IDs to spot IDs
+Nucleus  = collections.namedtuple('Nucleus',  ['experimentID', 'fields', 'spots', 'distances', 'spot_index'])
+Spot     = collections.namedtuple('Spot',     ['fields', 'color', 'ID_dist', 'rank'])
+Distance = collections.namedtuple('Distance', ['fields', 'spot1', 'spot2'])
+
+
+# find e.g. green in 'Objects_Population - green spots.txt'
+spot_file_pattern = re.compile(r' - (\w+) spots')
+# find e.g. GFR in 'Objects_Population - GFRSpot Pairs.txt'
+pair_file_pattern = re.compile(r'(\w+)Spot Pairs')
+# find e.g. GFR and 1 in 'green spots - GFR_Spot1Index'
+dist_pattern = re.compile(r' - (\w+)_Spot(\d+)Index')
+
+
+def table_name(file_name):
+    ''' the name of an Objects file without its folders, for a file in a zip archive also without the archive '''
+    
+    if isinstance(file_name, ZipPath):
+        return posixpath.basename(file_name.member)
+    return os.path.basename(file_name)
+
+
+def table_roles(file_name_set):
+    '''
+    find the tables of one measurement folder in a single pass over its files
+    the files are told apart by their names only, so folders or archives named like a table, e.g. "Selected plates.zip", do not count
+    returns the index of the selected nuclei file and lists of (index, color) for the spot and the spot pair files
+    '''
+    
+    selected_index = int()
+    spot_files = list()
+    pair_files = list()
+    
+    for index, element in enumerate(map(table_name, file_name_set)):
+        
+        # selected nuclei file in input list, the last one wins
+        if "Selected" in element:
+            selected_index = index
+        
+        if " spots" in element: # the space is important here!
+            
+            # tell me your color
+            match = spot_file_pattern.search(element)
+            if match is not None:
+                spot_files.append( (index, match.group(1)) )
+        
+        if "Pairs" in element:
+            
+            # tell me your color
+            match = pair_file_pattern.search(element)
+            if match is None:
+                continue # to next file
+            # expected yield GR, GFR or RFR or ...
+            color = match.group(1)
+            pair_files.append( (index, color) )
+    
+    return selected_index, spot_files, pair_files
+
+
+def nucleus_out_header(header):
+    ''' include "Nuclei Selected - " to all header fields of the nuclei table '''
+    
+    out_header = list()
+    out_header.append('experiment')
+    for i in range(len(header)):
+        if 'Nuclei Selected' in header[i]:
+            out_header.append( header[i] )
+        else:
+            header_element = 'Nuclei Selected - %s' % header[i]
+            out_header.append( header_element )
+    return out_header
+
+
+def spot_out_header(header):
+    ''' include "Spotzz - " to all header fields of a spot table, zz becomes the spot number in the output '''
+    
+    out_header = list()
+    for i in range(len(header)):
+        if '_' in header[i]:
+            header_element = header[i].split('_')[1]
+            header_element = 'Spotzz - %s' % header_element
+            out_header.append( header_element )
+        elif 'spots' in header[i]:
+            header_element = header[i].split(' - ')[1]
+            header_element = 'Spotzz - %s' % header_element
+            out_header.append( header_element )
+        else:
+            header_element = 'Spotzz - %s' % header[i]
+            out_header.append(header_element )
+    out_header.append('Spotzz - color')
+    return out_header
+
+
+def distance_out_header(header):
+    ''' include "Distance - " to all header fields of a spot pair table '''
+    
+    out_header = list()
+    for i in range(len(header)):
+        if '_' in header[i]:
+            header_element = header[i].split('_')[1]
+            header_element = 'Distance - %s' % header_element
+            out_header.append( header_element )
+        elif ' - ' in header[i]:
+            header_element = header[i].split(' - ')[1]
+            header_element = 'Distance - %s' % header_element
+            out_header.append( header_element )
+        else:
+            header_element = 'Distance - %s' % header[i]
+            out_header.append(header_element )
+    return out_header
+
+
+def spot_dist_columns(header):
+    '''
+    identify elements, e.g. 'green spots - GR_Spot1Index' and NOT 'green spots - Spot Contrast'
+    returns their column together with the spot number and color pair they link to
+    '''
+    
+    dist_columns = list()
+    for i in range(len(header)):
+        if '_Spot' in header[i]:
+            dist_match = dist_pattern.search(header[i])
+            dist_color = dist_match.group(1)
+            dist_count = int( dist_match.group(2) )
+            dist_columns.append( (i, 'spot%d' % dist_count, dist_color) )
+    return dist_columns
+
+
+def table_cells(table, typed, selection, field_names):
+    '''
+    prepare a table with header for its records: returns the header and, with typed=True, the types of the stored cells,
+    the rows passing the --where filters of the Selection selection and a function turning a row into the stored cells,
+    None to store the row as it is
+    field_names turns the header into the output names of the cells, which --columns matches
+    '''
+    
+    rows = table.rows()
+    header = table.header
+    types = None
+    convert = None
+    if typed:
+        columns, rows = typed_rows(table)
+        header, types, convert = columns.header, columns.types, columns.convert
+    rows = selection.filter_rows(rows, table.header)
+    
+    kept = selection.kept_columns(field_names(header))
+    if kept is not None:
+        header = [header[i] for i in kept]
+        if typed:
+            types = [types[i] for i in kept]
+        project = column_getter(kept)
+        convert = project if convert is None else (lambda fields, convert=convert: project(convert(fields)))
+    
+    return header, types, rows, convert
+
+
+def read_measurement(file_name_set, selected_data, auxilary_data, profile=None, typed=False, selection=None):
+    '''
+    read the Objects files of one measurement folder into selected_data, a Nucleus record per selected nucleus
+    output header parts and the colors of the spot and spot pair tables go to auxilary_data, time and rows of every table type to the StageProfile profile
+    with typed=True the fields of the records are typed values, see typed.py, and the column types go to auxilary_data too
+    the Selection selection drops rows and columns while the tables are read
+    '''
+    
+    if profile is None:
+        profile = StageProfile()
+    if selection is None:
+        selection = Selection()
+    
+    selected_index, spot_files, pair_files = table_roles(file_name_set)
+    profile.start()
+    
+    # the files are opened one at a time and closed, when the folder is read or reading fails
+    with TableFiles(file_name_set) as input_files:
+        ##################
+        # nuclei selected
+        ##################
+        
+        table = ObjectsTable(input_files.open(selected_index))
+        experimentID = table.experimentID
+        rows = table.rows()
+        convert = None
+        if table.header is not None:
+            header, types, rows, convert = table_cells(table, typed, selection, lambda header: nucleus_out_header(header)[1:])
+            if typed:
+                auxilary_data['nucleus_types'] = ['str'] + types
+            auxilary_data['nucleus'] = '\t'.join( nucleus_out_header(header) )
+        
+        # a folder of another experiment is skipped, only the header of its tables is read
+        skip_folder = not selection.keep_experiment(experimentID)
+        if skip_folder:
+            rows = iter(())
+        
+        nucleus_key = column_getter([0,1,2,3,4])
+        
+        for fields in rows:
+            ID_s = '_'.join(nucleus_key(fields)) # selected nuclei ID
+            
+            selected_data[ID_s] = Nucleus(experimentID, convert(fields) if convert else fields, collections.OrderedDict(), collections.OrderedDict(), dict())
+        
+        if experimentID is None and selected_data:
+            raise ValueError( "no Plate Name line before the data block of {0}".format(file_name_set[selected_index]) )
+        profile.count('nuclei', table.row_count)
+        profile.lap('nuclei')
+        
+        ##############    
+        # color spots
+        ##############
+        # this table uses selected nuclei number as indicator
+        # the output header is taken from the first spot table
+        write_header = True
+        nucleus_key = column_getter([0,1,2,3,20])
+        spot_colors = list()
+        
+        for file_index, color in spot_files:
+            
+            table = ObjectsTable(input_files.open(file_index))
+            if table.header is None:
+                continue
+            spot_colors.append(color)
+            dist_columns = spot_dist_columns(table.header)
+            header, types, rows, convert = table_cells(table, typed, selection, lambda header: spot_out_header(header)[:-1])
+            if skip_folder:
+                rows = iter(())
+            
+            if write_header is True:
+                auxilary_data['spot'] = spot_out_header(header)
+                if typed:
+                    auxilary_data['spot_types'] = types + ['str']
+                write_header = False
+            
+            for fields in rows:
+                
+                ID_s    = '_'.join(nucleus_key(fields))
+                ID_spot = '_'.join(['spot', ID_s, fields[4], color])
+                # ID, which is found in the distance feature file
+                ID_dist = [ '_'.join([dist_count, ID_s, fields[i], dist_color]) for i, dist_count, dist_color in dist_columns ]
+                
+                # a spot read again replaces the earlier one, but keeps its place within the nucleus
+                nucleus = selected_data[ID_s]
+                try:
+                    rank = nucleus.spots[ID_spot].rank
+                except KeyError:
+                    rank = len(nucleus.spots)
+                nucleus.spots[ID_spot] = Spot(convert(fields) if convert else fields, color, ID_dist, rank)
+                
+                # index the spot by its distance IDs, so the output does not have to search all spots of a nucleus
+                for ID in ID_dist:
+                    nucleus.spot_index.setdefault(ID, list()).append(ID_spot)
+            
+            profile.count('spots', table.row_count)
+        # the colors of the spot and spot pair tables, e.g. the columns of the summary tables, are taken like the header parts
+        if spot_colors:
+            auxilary_data['spot_colors'] = spot_colors
+        profile.lap('spots')
+        
+        #################
+        # spot distances
+        #################
+        # this table uses selected nuclei as indicator
+        # the output header is taken from the first spot pair table
+        write_header = True
+        nucleus_key = column_getter([0,1,2,3,14])
+        pair_colors = list()
+        
+        for file_index, color in pair_files:
+            
+            table = ObjectsTable(input_files.open(file_index))
+            if table.header is None:
+                continue
+            pair_colors.append(color)
+            header, types, rows, convert = table_cells(table, typed, selection, distance_out_header)
+            if skip_folder:
+                rows = iter(())
+            
+            if write_header is True:
+                auxilary_data['distance'] = '\t'.join( distance_out_header(header) )
+                if typed:
+                    auxilary_data['distance_types'] = types
+                write_header = False
+            
+            for fields in rows:
+                
+                ID_s      = '_'.join(nucleus_key(fields))
+                ID_dist   = '_'.join(['dist', ID_s, fields[13], color])
+                ID_spot_1 = '_'.join(['spot1', ID_s, fields[15], color])
+                ID_spot_2 = '_'.join(['spot2', ID_s, fields[16], color])
+                
+                # spot1 and spot2 are the IDs, which could be found in the single spot ID lists
+                selected_data[ID_s].distances[ID_dist] = Distance(convert(fields) if convert else fields, ID_spot_1, ID_spot_2)
+            
+            profile.count('pairs', table.row_count)
+        if pair_colors:
+            auxilary_data['pair_colors'] = pair_colors
+        profile.lap('pairs')
+
+
+def header_names(header):
+    ''' the column names in a tab separated header of auxilary_data, none for an empty header, e.g. if --columns drops all '''
+    
+    return header.split('\t') if header else []
+
+
+def output_header(auxilary_data):
+    ''' the column names of the merged table '''
+    
+    # create header
+    out_header = header_names(auxilary_data['nucleus'])
+    out_header += header_names(auxilary_data['distance'])
+    out_header += [x.replace('zz','1') for x in auxilary_data['spot']]
+    out_header += [x.replace('zz','2') for x in auxilary_data['spot']]
+    return out_header
+
+
+def output_types(auxilary_data):
+    ''' the types of the columns of output_header(), for records read with typed=True '''
+    
+    return auxilary_data['nucleus_types'] + auxilary_data['distance_types'] + auxilary_data['spot_types'] * 2
+
+
+def distance_spots(nucleus, distance):
+    ''' the spots of a distance as (ID, Spot), in the order they were read '''
+    
+    # check out the corresponding spot data via the spot index
+    # spots are written in the order they were read, as if all spots of the nucleus were searched
+    candidate_spots = [ (ID_spot, nucleus.spots[ID_spot]) for ID_spot in set( nucleus.spot_index.get(distance.spot1, []) + nucleus.spot_index.get(distance.spot2, []) ) ]
+    candidate_spots.sort(key=lambda candidate: candidate[1].rank)
+    
+    # if this succeeds the spot belongs to the distance (the index may hold outdated IDs of a spot that was read twice)
+    return [ (ID_spot, spot) for ID_spot, spot in candidate_spots if distance.spot1 in spot.ID_dist or distance.spot2 in spot.ID_dist ]
+
+
+def merged_lines(selected_data, auxilary_data):
+    '''
+    yield one tab separated line per distance of every nucleus in selected_data, nuclei without distances get a single line
+    missing values are 'NA'
+    lines are put together from the text of the nucleus, of the distance and of the spots, every one joined once,
+    and the NA padding up to the width of the table, so no line is copied cell by cell
+    '''
+    
+    nucleus_header_count = len(header_names(auxilary_data['nucleus']))
+    distance_header_count = len(header_names(auxilary_data['distance']))
+    spot_header_count = len(auxilary_data['spot'])
+    total = nucleus_header_count + distance_header_count + 2*spot_header_count # nucleus header holds the manually added experiment ID
+    offset = nucleus_header_count + distance_header_count
+    
+    # padding[n] fills n missing cells at the end of a line
+    padding = ['\tNA' * count for count in range(total + 1)]
+    
+    # data looks like:
+    # {    '1_1_0_44_6': Nucleus(experimentID='plate1',
+    #                            fields=('1', '1', '0', '44', '6', '[99,59,128,99]', ...),
+    #                            spots=OrderedDict([('spot_1_1_0_44_6_4_green', Spot(fields=('1', '1', '0', '44', '4', '[109,63,117,70]', '1638.88', ...),
+    #                                                                                color='green',
+    #                                                                                ID_dist=['spot1_1_1_0_44_6_1_GR', 'spot1_1_1_0_44_6_1_GFR'],
+    #                                                                                rank=0)), ...]),
+    #                            distances=OrderedDict([('dist_1_1_0_44_6_1_GFR', Distance(fields=('1', '1', '0', '44', '[114,69,122,86]', ...),
+    #                                                                                     spot1='spot1_1_1_0_44_6_1_GFR',
+    #                                                                                     spot2='spot2_1_1_0_44_6_1_GFR')), ...]),
+    #                            spot_index={'spot1_1_1_0_44_6_1_GR': ['spot_1_1_0_44_6_4_green'], ...})
+
+    for nucleus in selected_data.values():
+    
+        # write nucleus characteristics & experiment name
+        head = '\t'.join((nucleus.experimentID,) + nucleus.fields)
+        head_width = 1 + len(nucleus.fields)
+        
+        # a spot belongs to several distances of its nucleus, so its text is joined only the first time
+        spot_text = dict()
+        
+        for distance in nucleus.distances.values():
+            
+            # write out all the "distance" features
+            parts = [head]
+            if distance.fields:
+                parts.append('\t'.join(distance.fields))
+            width = head_width + len(distance.fields)
+            
+            for ID_spot, spot in distance_spots(nucleus, distance):
+                
+                # write spot data and color to collected line
+                if ID_spot not in spot_text:
+                    spot_text[ID_spot] = '\t'.join(spot.fields + (spot.color,))
+                parts.append(spot_text[ID_spot])
+                width += len(spot.fields) + 1
+            
+            yield '\t'.join(parts) + padding[max(0, total - width)]
+    
+        # what happens, if there are no "distance" entries?
+        # there should be maximum 1 spot, because otherwise there would be a distance calculated
+        # if there's no spot reported at all - this block will also report the empty nucleus
+        if not nucleus.distances:
+            
+            spots = list(nucleus.spots.values())
+            if not spots:
+                yield head + padding[max(0, total - head_width)]
+                continue
+            
+            # the spot is written past the distance fields, over the spots before it
+            last = spots[-1]
+            if head_width <= offset and all(len(spot.fields) <= len(last.fields) for spot in spots):
+                yield head + padding[offset - head_width] + '\t' + '\t'.join(last.fields + (last.color,)) + padding[max(0, total - offset - len(last.fields) - 1)]
+                continue
+            
+            # a shorter last spot leaves cells of the spots before it, they are replayed cell by cell
+            out_line = [nucleus.experimentID] + list(nucleus.fields)
+            out_line += ['NA'] * (total - len(out_line))
+            for spot in spots:
+                
+                # set write index to 50, which is the index past distance fields
+                current_write_index = offset
+                
+                # write spot data and color to collected line
+                out_line[current_write_index:current_write_index + len(spot.fields)] = spot.fields
+                current_write_index += len(spot.fields)
+                out_line[current_write_index] = spot.color
+            
+            yield '\t'.join(out_line)
+
+
+def merged_cells(selected_data, auxilary_data):
+    '''
+    the lines of merged_lines() as tuples of cells, for records read with typed=True
+    missing values are None, the cells of the records keep their type
+    '''
+    
+    nucleus_header_count = len(header_names(auxilary_data['nucleus']))
+    distance_header_count = len(header_names(auxilary_data['distance']))
+    spot_header_count = len(auxilary_data['spot'])
+    total = nucleus_header_count + distance_header_count + 2*spot_header_count
+    offset = nucleus_header_count + distance_header_count
+    
+    padding = [(None,) * count for count in range(total + 1)]
+    
+    for nucleus in selected_data.values():
+        
+        head = (nucleus.experimentID,) + tuple(nucleus.fields)
+        
+        for distance in nucleus.distances.values():
+            line = head + tuple(distance.fields)
+            for ID_spot, spot in distance_spots(nucleus, distance):
+                line += tuple(spot.fields) + (spot.color,)
+            yield line + padding[max(0, total - len(line))]
+        
+        # nuclei without distances like in merged_lines()
+        if not nucleus.distances:
+            
+            spots = list(nucleus.spots.values())
+            if not spots:
+                yield head + padding[max(0, total - len(head))]
+                continue
+            
+            last = spots[-1]
+            if len(head) <= offset and all(len(spot.fields) <= len(last.fields) for spot in spots):
+                yield head + padding[offset - len(head)] + tuple(last.fields) + (last.color,) + padding[max(0, total - offset - len(last.fields) - 1)]
+                continue
+            
+            out_line = list(head)
+            out_line += [None] * (total - len(out_line))
+            for spot in spots:
+                out_line[offset:offset + len(spot.fields)] = spot.fields
+                out_line[offset + len(spot.fields)] = spot.color
+            yield tuple(out_line)
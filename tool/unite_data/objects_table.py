@@ -0,0 +1,100 @@
+################
+# single pass reader of the Objects_Population tables of Harmony/Columbus image analysis exports
+# every table starts with a preamble holding e.g. the Plate Name, the data block follows the [Data] line:
+# a header line starting with Row and one tab separated line per object
+# the nuclei, spot and spot pair tables all look like this, so they share this reader
+################
+
+import itertools
+import operator
+
+
+class ObjectsTable(object):
+    '''
+    read one Objects table from an open file or any other iterable of text lines, e.g. io.StringIO, a zip archive member or inputs.MappedLines
+    the preamble and the header are read on creation, rows() or text() then read the data block in a single pass
+
+    experimentID is the last value of the Plate Name line, header the list of column names
+    columns maps the column names to their index, the first one for repeated names
+    row_count is the number of data lines read so far
+    header is None, if the table has no data block
+    '''
+
+    def __init__(self, in_file):
+        self.experimentID = None
+        self.header = None
+        self.columns = dict()
+        self.row_count = 0
+
+        # a file, which can jump to the [Data] line like inputs.MappedLines, only hands over the preamble before it
+        in_data = False
+        preamble = in_file.preamble('[Data]') if hasattr(in_file, 'preamble') else None
+        if preamble is not None:
+            for line in preamble:
+                line = line.strip()
+                if line.startswith('Plate Name'):
+                    self.experimentID = line.split('\t')[-1]
+            in_data = True
+
+        self.lines = iter(in_file)
+        for line in self.lines:
+            line = line.strip()
+
+            if not in_data:
+                if line.startswith('Plate Name'):
+                    self.experimentID = line.split('\t')[-1]
+                elif line.startswith('[Data]'):
+                    in_data = True
+
+            # the header is the first line of the data block
+            elif line.startswith('Row'):
+                self.header = line.split('\t')
+                break
+            elif line:
+                raise ValueError( "table line before the header line starting with Row: {0}".format(line) )
+
+        if self.header is not None:
+            for i, name in enumerate(self.header):
+                self.columns.setdefault(name, i)
+
+    def rows(self):
+        '''
+        yield the cells of every line of the data block as tuple, cut to the length of the header
+        lines are stripped and split by map() over the str methods, so only the length check runs in Python
+        '''
+
+        if self.header is None:
+            return
+        header_count = len(self.header)
+
+        for fields in map(tuple, map(str.split, map(str.strip, self.lines), itertools.repeat('\t'))):
+            if len(fields) != header_count:
+                if len(fields) > header_count:
+                    fields = fields[:header_count]
+                elif fields == ('',):
+                    continue # empty line
+                else:
+                    raise IndexError( "line has {0} fields, but the header has {1}: {2}".format(len(fields), header_count, '\t'.join(fields)) )
+            self.row_count += 1
+            yield fields
+
+    def text(self):
+        ''' the rest of the data block as one string of stripped lines, for bulk parsers like pandas.read_csv '''
+
+        if self.header is None:
+            return ''
+        return '\n'.join( map(str.strip, self.lines) )
+
+
+def column_getter(columns):
+    '''
+    fetch the cells of columns from a row as tuple in a single C call, e.g. the columns of an ID
+    a single column and no column at all give a tuple as well
+    '''
+
+    if len(columns) == 0:
+        return lambda fields: ()
+    if len(columns) == 1:
+        column = columns[0]
+        return lambda fields: (fields[column],)
+    return operator.itemgetter(*columns)
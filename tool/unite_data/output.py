@@ -0,0 +1,293 @@
+################
+# write the merged table as tab separated text, plain or compressed, Parquet or Feather file
+################
+
+import gzip
+import itertools
+import os
+
+from .merge import output_header, output_types
+
+# values an Arrow type is tried on before a whole column is converted to it, a failing conversion costs many times a successful one
+SAMPLE_VALUES = 1024
+
+
+# every writer takes the header parts with write_header() and then the lines of the merged table as tab separated strings
+# with write_lines(), or as tuples of typed cells with write_rows() in typed mode, both return the number of lines written
+# a line with another number of cells than the header raises ValueError, instead of shifting cells into other columns
+
+
+def check_width(widths, header, rows):
+    ''' raise ValueError, if one of the cell counts in widths differs from the length of header, rows are the lines written before '''
+    
+    for i, width in enumerate(widths):
+        if width != len(header):
+            raise ValueError( "line {0} of the merged table has {1} cells, but the header has {2}".format(rows + i + 1, width, len(header)) )
+
+class TsvOutput(object):
+    '''
+    write the merged table as tab separated text, optionally compressed with gzip or zstd
+    lines are written in chunks of LINES_PER_WRITE lines, every chunk with a single write
+    '''
+    
+    LINES_PER_WRITE = 4096
+    
+    def __init__(self, out_path, compression=None):
+        self.header = None
+        self.rows = 0
+        if compression is None:
+            self.out_file = open(out_path, 'w', buffering=1 << 20)
+        elif compression == 'gzip':
+            # the level of the gzip command, level 9 is several times slower for a few percent smaller tables
+            self.out_file = gzip.open(out_path, 'wt', compresslevel=6)
+        elif compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError( "--compression zstd needs the zstandard package" )
+            self.out_file = zstandard.open(out_path, 'wt')
+        else:
+            raise ValueError( "compression:{0} is not gzip or zstd".format(compression) )
+    
+    def write_header(self, auxilary_data):
+        self.header = output_header(auxilary_data)
+        self.out_file.write( '\t'.join(self.header) + '\n' )
+    
+    def write_lines(self, lines):
+        rows = 0
+        lines = iter(lines)
+        tabs = len(self.header) - 1
+        for chunk in iter(lambda: list(itertools.islice(lines, self.LINES_PER_WRITE)), []):
+            # the tabs of a whole chunk are counted in C, only a chunk with a wrong line is checked line by line
+            if set(map(str.count, chunk, itertools.repeat('\t'))) != {tabs}:
+                check_width([line.count('\t') + 1 for line in chunk], self.header, self.rows + rows)
+            self.out_file.write( '\n'.join(chunk) + '\n' )
+            rows += len(chunk)
+        self.rows += rows
+        return rows
+    
+    def write_rows(self, rows):
+        return self.write_lines( '\t'.join(['NA' if value is None else str(value) for value in row]) for row in rows )
+    
+    def close(self):
+        self.out_file.close()
+
+
+# the Arrow types of a column from the narrowest to the widest, a column takes the widest type of all its batches
+def arrow_types():
+    import pyarrow
+    return [pyarrow.null(), pyarrow.int64(), pyarrow.float64(), pyarrow.string()]
+
+
+def wider_type(type1, type2):
+    types = arrow_types()
+    return types[max(types.index(type1), types.index(type2))]
+
+
+def text_columns(lines, width):
+    ''' the columns of tab separated lines as Arrow arrays of strings, split in C by the csv reader of pyarrow '''
+    
+    import pyarrow
+    import pyarrow.csv
+    
+    names = ['%d' % i for i in range(width)]
+    table = pyarrow.csv.read_csv( pyarrow.py_buffer( ('\n'.join(lines) + '\n').encode('utf-8') ),
+                                  read_options=pyarrow.csv.ReadOptions(column_names=names),
+                                  parse_options=pyarrow.csv.ParseOptions(delimiter='\t', quote_char=False),
+                                  convert_options=pyarrow.csv.ConvertOptions(column_types=dict.fromkeys(names, pyarrow.string()), strings_can_be_null=False) )
+    return table.columns
+
+
+def text_column(column, arrow_type=None):
+    '''
+    convert an Arrow array of the strings of a column to int64, float64 or string, the narrowest type of arrow_type and wider
+    that holds all values, converted in C by pyarrow.compute
+    like R's read.table 'NA' is missing in every column, empty cells are missing in numeric columns and a column without values is all missing
+    '''
+    
+    import pyarrow
+    import pyarrow.compute
+    
+    types = arrow_types()
+    missing = pyarrow.compute.is_in(column, value_set=pyarrow.array(['NA', '']))
+    present = pyarrow.compute.if_else(missing, None, column)
+    if present.null_count == len(present) and (arrow_type is None or arrow_type == pyarrow.null()):
+        return pyarrow.nulls(len(column))
+    
+    for candidate in types[max(1, types.index(arrow_type) if arrow_type is not None else 1):3]:
+        try:
+            pyarrow.compute.cast(present.slice(0, SAMPLE_VALUES), candidate)
+            return pyarrow.compute.cast(present, candidate)
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowNotImplementedError):
+            continue
+    return pyarrow.compute.if_else(pyarrow.compute.equal(column, 'NA'), None, column)
+
+
+def declared_column(values, arrow_type):
+    '''
+    an Arrow array of the typed cells of a column in typed mode, of arrow_type, the type of the column so far,
+    a column, which does not fit that type in every measurement folder, becomes float64 or finally string
+    '''
+    
+    import pyarrow
+    
+    types = arrow_types()
+    for candidate in types[types.index(arrow_type):3]:
+        try:
+            return pyarrow.array(values, type=candidate)
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError, OverflowError):
+            continue
+    return pyarrow.array([value if value is None else str(value) for value in values], type=pyarrow.string())
+
+
+def unique_names(header):
+    ''' column names need to be unique in Arrow tables, repeated names get a suffix like R's make.unique() '''
+    
+    names = list()
+    seen = dict()
+    for name in header:
+        if name in seen:
+            seen[name] += 1
+            name = '%s.%d' % (name, seen[name])
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+class ArrowOutput(object):
+    '''
+    write the merged table as Parquet or Feather file with one typed column per output column
+    the lines are converted and written ROWS_PER_BATCH at a time, so memory stays bounded by a batch also with --streaming
+    the types are fixed by the first batch, or by the types inferred in typed mode, a later batch with a value not fitting its column
+    widens the type of that column, e.g. int64 to float64, and the batches written so far are rewritten with the wider type
+    '''
+    
+    ROWS_PER_BATCH = 1 << 15
+    
+    def __init__(self, out_path, out_format):
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError( "--format {0} needs the pyarrow package".format(out_format) )
+        
+        self.out_path = out_path
+        self.out_format = out_format
+        self.header = None
+        self.names = None
+        self.types = None
+        self.writer = None
+        self.schema = None
+        self.rows = 0
+    
+    def write_header(self, auxilary_data):
+        import pyarrow
+        
+        self.header = output_header(auxilary_data)
+        self.names = unique_names(self.header)
+        if 'nucleus_types' in auxilary_data:
+            declared = {'int': pyarrow.int64(), 'float': pyarrow.float64(), 'str': pyarrow.string()}
+            self.types = [declared[column_type] for column_type in output_types(auxilary_data)]
+    
+    def open_writer(self, schema):
+        import pyarrow
+        
+        if self.out_format == 'parquet':
+            import pyarrow.parquet
+            return pyarrow.parquet.ParquetWriter(self.out_path, schema)
+        # Feather version 2 is the Arrow IPC file format, compressed with lz4 by default
+        compression = 'lz4' if pyarrow.Codec.is_available('lz4') else None
+        return pyarrow.ipc.new_file(self.out_path, schema, options=pyarrow.ipc.IpcWriteOptions(compression=compression))
+    
+    def written_batches(self, path):
+        ''' the record batches of a file written by open_writer() '''
+        
+        import pyarrow
+        
+        if self.out_format == 'parquet':
+            import pyarrow.parquet
+            for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=self.ROWS_PER_BATCH):
+                yield batch
+        else:
+            with pyarrow.memory_map(path) as source:
+                reader = pyarrow.ipc.open_file(source)
+                for i in range(reader.num_record_batches):
+                    yield reader.get_batch(i)
+    
+    def write_arrays(self, arrays):
+        ''' write the arrays of a batch of lines, widening the columns written so far, where they do not fit '''
+        
+        import pyarrow
+        
+        table = pyarrow.Table.from_arrays(arrays, names=self.names)
+        if self.writer is None:
+            self.schema = table.schema
+            self.writer = self.open_writer(self.schema)
+        elif table.schema != self.schema:
+            # a rare case, e.g. a decimal number in a column of integers so far, which pays one pass over the file
+            self.schema = pyarrow.schema( [(name, wider_type(written, new)) for name, written, new in zip(self.names, self.schema.types, table.schema.types)] )
+            self.writer.close()
+            written_path = self.out_path + '.narrow'
+            os.replace(self.out_path, written_path)
+            try:
+                self.writer = self.open_writer(self.schema)
+                for written in self.written_batches(written_path):
+                    self.writer.write_table( pyarrow.Table.from_batches([written]).cast(self.schema) )
+            finally:
+                os.remove(written_path)
+            table = table.cast(self.schema)
+        self.writer.write_table(table)
+    
+    def column_types(self):
+        ''' the types the next batch is converted to: those written so far, those of typed mode or None to infer them '''
+        
+        if self.schema is not None:
+            return self.schema.types
+        if self.types is not None:
+            return self.types
+        return [None] * len(self.header)
+    
+    def write_lines(self, lines):
+        rows = 0
+        lines = iter(lines)
+        tabs = len(self.header) - 1
+        for chunk in iter(lambda: list(itertools.islice(lines, self.ROWS_PER_BATCH)), []):
+            if set(map(str.count, chunk, itertools.repeat('\t'))) != {tabs}:
+                check_width([line.count('\t') + 1 for line in chunk], self.header, self.rows + rows)
+            columns = text_columns(chunk, len(self.header))
+            self.write_arrays( [text_column(column, arrow_type) for column, arrow_type in zip(columns, self.column_types())] )
+            rows += len(chunk)
+        self.rows += rows
+        return rows
+    
+    def write_rows(self, rows):
+        count = 0
+        rows = iter(rows)
+        width = len(self.header)
+        for chunk in iter(lambda: list(itertools.islice(rows, self.ROWS_PER_BATCH)), []):
+            if set(map(len, chunk)) != {width}:
+                check_width(list(map(len, chunk)), self.header, self.rows + count)
+            arrays = [declared_column(values, arrow_type) for values, arrow_type in zip(zip(*chunk), self.column_types())]
+            self.write_arrays(arrays)
+            count += len(chunk)
+        self.rows += count
+        return count
+    
+    def close(self):
+        import pyarrow
+        
+        # a table without lines is written with the types known, columns of unknown type are all missing
+        if self.writer is None:
+            types = self.types if self.types is not None else [pyarrow.null()] * len(self.header)
+            self.write_arrays( [pyarrow.array([], type=arrow_type) for arrow_type in types] )
+        self.writer.close()
+
+
+def open_output(out_path, out_format, compression=None):
+    ''' the output writer for --format and --compression '''
+    
+    if out_format == 'tsv':
+        return TsvOutput(out_path, compression)
+    if compression is not None:
+        raise ValueError( "--compression only applies to --format tsv, {0} files are compressed already".format(out_format) )
+    return ArrowOutput(out_path, out_format)
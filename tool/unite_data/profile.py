@@ -0,0 +1,86 @@
+################
+# time and row counts of the merge stages, reported with --profile
+################
+
+import collections
+import sys
+import time
+
+
+class StageProfile(object):
+    '''
+    wall time and row counts of the merge stages for --profile
+    a stage is timed from the previous lap() or start(), folders read by worker processes bring their own profile
+    '''
+    
+    def __init__(self):
+        self.seconds = collections.OrderedDict()
+        self.rows = collections.OrderedDict()
+        self.start()
+    
+    def start(self):
+        self.last = time.perf_counter()
+    
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + now - self.last
+        self.last = now
+    
+    def count(self, stage, rows):
+        self.rows[stage] = self.rows.get(stage, 0) + rows
+    
+    def add(self, other):
+        for stage, seconds in other.seconds.items():
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        for stage, rows in other.rows.items():
+            self.count(stage, rows)
+    
+    def summary(self):
+        ''' the stages as list of dicts with seconds, rows and rows per second '''
+        
+        stages = list()
+        for stage, seconds in self.seconds.items():
+            rows = self.rows.get(stage)
+            rate = int(rows / seconds) if rows is not None and seconds > 0 else None
+            stages.append( collections.OrderedDict([('stage', stage), ('seconds', round(seconds, 4)), ('rows', rows), ('rows_per_second', rate)]) )
+        return stages
+
+
+def peak_rss():
+    ''' peak resident memory in MB of this process and of its finished worker processes, None without the resource module (Windows) '''
+    
+    try:
+        import resource
+    except ImportError:
+        return None
+    
+    # ru_maxrss is in kB on Linux, but in bytes on macOS
+    scale = 1024.0**2 if sys.platform == 'darwin' else 1024.0
+    return collections.OrderedDict([
+        ('main', round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)),
+        ('workers', round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1)),
+    ])
+
+
+def profile_summary(profile, wall_seconds, **info):
+    ''' the --profile report as dict, info holds settings of the run like the engine '''
+    
+    summary = collections.OrderedDict(sorted(info.items()))
+    summary['wall_seconds'] = round(wall_seconds, 4)
+    summary['peak_rss_mb'] = peak_rss()
+    summary['stages'] = profile.summary()
+    return summary
+
+
+def print_profile(summary, out_file=sys.stderr):
+    ''' the --profile report as table for humans '''
+    
+    out_file.write( '{0:<12}{1:>10}{2:>12}{3:>12}\n'.format('stage', 'seconds', 'rows', 'rows/s') )
+    for stage in summary['stages']:
+        rows = '' if stage['rows'] is None else stage['rows']
+        rate = '' if stage['rows_per_second'] is None else stage['rows_per_second']
+        out_file.write( '{0:<12}{1:>10.3f}{2:>12}{3:>12}\n'.format(stage['stage'], stage['seconds'], rows, rate) )
+    
+    out_file.write( 'wall time: {0:.3f} s\n'.format(summary['wall_seconds']) )
+    if summary['peak_rss_mb'] is not None:
+        out_file.write( 'peak RSS: {0} MB, worker processes {1} MB\n'.format(summary['peak_rss_mb']['main'], summary['peak_rss_mb']['workers']) )
@@ -0,0 +1,97 @@
+################
+# --columns and --where: the columns and rows of the merged table to keep, applied while the tables are read,
+# so dropped rows never become records and dropped cells are never stored or written
+################
+
+import fnmatch
+
+# the keys of --where and the column they filter in every table, experiment filters by the Plate Name of the folder
+WHERE_COLUMNS = {'row': 'Row', 'column': 'Column', 'timepoint': 'Timepoint', 'field': 'Field'}
+
+
+def parse_where(expressions):
+    '''
+    the --where expressions like field=1,3-5 or experiment=Plate1 as dict of the key and the set of values to keep
+    values are compared as the text of the cells, ranges only apply to numbers, repeated keys keep the values in all of them
+    raises ValueError for an expression of another form
+    '''
+
+    where = dict()
+    for expression in expressions:
+        key, separator, values = expression.partition('=')
+        key = key.strip().lower()
+        if not separator or key not in list(WHERE_COLUMNS) + ['experiment']:
+            raise ValueError( "--where {0} is not like field=1,3-5, the keys are experiment, {1}".format(expression, ', '.join(sorted(WHERE_COLUMNS))) )
+
+        allowed = set()
+        for value in values.split(','):
+            value = value.strip()
+            start, dash, end = value.partition('-')
+            if key != 'experiment' and dash and start.isdigit() and end.isdigit():
+                allowed.update( str(i) for i in range(int(start), int(end) + 1) )
+            else:
+                allowed.add(value)
+        where[key] = where[key] & allowed if key in where else allowed
+    return where
+
+
+class Selection(object):
+    '''
+    the --columns glob patterns on the names of the output header and the --where filters of a merge
+    an empty Selection keeps everything and leaves the rows of the tables untouched
+    '''
+
+    def __init__(self, columns=None, where=None):
+        self.patterns = list(columns) if columns else None
+        self.where = parse_where(where or [])
+
+    def key(self):
+        ''' text identifying the selection, e.g. for the cache '''
+
+        if self.patterns is None and not self.where:
+            return ''
+        return repr( (self.patterns, sorted((key, sorted(values)) for key, values in self.where.items())) )
+
+    def keep_experiment(self, experimentID):
+        return 'experiment' not in self.where or experimentID in self.where['experiment']
+
+    def filter_rows(self, rows, header):
+        ''' the rows of a table with header, which pass the --where filters on its columns '''
+
+        for key, index in self.where_columns(header):
+            allowed = self.where[key]
+            rows = filter(lambda fields, index=index, allowed=allowed: fields[index] in allowed, rows)
+        return rows
+
+    def filter_frame(self, frame, header):
+        ''' the vectorized counterpart of filter_rows() for a table frame of read_table_frame() '''
+
+        for key, index in self.where_columns(header):
+            frame = frame[ frame[index].isin(self.where[key]) ]
+        return frame.reset_index(drop=True)
+
+    def where_columns(self, header):
+        columns = list()
+        for key, name in sorted(WHERE_COLUMNS.items()):
+            if key in self.where:
+                if name not in header:
+                    raise ValueError( "--where {0} needs a {1} column in every table".format(key, name) )
+                columns.append( (key, header.index(name)) )
+        return columns
+
+    def kept_columns(self, names):
+        '''
+        the index of every output column name in names matching a --columns pattern, None for all columns
+        spot names hold zz for the spot number, they are kept for both spots, if the name of one of them matches
+        '''
+
+        if self.patterns is None:
+            return None
+
+        kept = list()
+        for i, name in enumerate(names):
+            variants = [name.replace('zz', '1'), name.replace('zz', '2')] if 'zz' in name else [name]
+            if any(fnmatch.fnmatchcase(variant, pattern) for variant in variants for pattern in self.patterns):
+                kept.append(i)
+        return kept
+
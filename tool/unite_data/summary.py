@@ -0,0 +1,275 @@
+################
+# summary side tables of a merge for --summaries PREFIX, small enough to be loaded before the merged table itself:
+#   PREFIX.nuclei.tsv       one line per nucleus: experiment, nucleus ID, spots per color and distances per spot pair color
+#   PREFIX.experiments.tsv  one line per experiment, color and measure: n, mean, sd, min, approximate quantiles and max
+#                           of the spots and distances per nucleus and of the distance columns of the spot pair tables
+# the tables are built from the records of every batch before it is written, so they hold the same nuclei as the merged table
+################
+
+import collections
+import itertools
+import math
+import operator
+
+from .merge import header_names
+
+# quantiles of the experiments table and their relative accuracy
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+RELATIVE_ACCURACY = 0.01
+# distinct values a QuantileSketch counts exactly, e.g. the spots per nucleus, before it falls back to buckets
+EXACT_VALUES = 1024
+
+# the distance columns of the spot pair tables, e.g. Distance - Distance [um]
+DISTANCE_MEASURE = 'Distance - Distance'
+
+nucleus_ID_names = ['Row', 'Column', 'Timepoint', 'Field', 'Object No']
+
+
+class QuantileSketch(object):
+    '''
+    approximate quantiles of a stream of numbers in bounded memory like DDSketch: values are counted in buckets,
+    whose bounds grow by the factor gamma, so every quantile is within RELATIVE_ACCURACY of the true one
+    memory grows with the logarithm of the range of the values, not with their number
+    up to EXACT_VALUES distinct values are counted as they are, which keeps the quantiles of counts exact
+    '''
+
+    def __init__(self, accuracy=RELATIVE_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.inverse_log_gamma = 1 / math.log(self.gamma)
+        self.positive = collections.Counter()
+        self.negative = collections.Counter()
+        self.zeros = 0
+        self.n = 0
+        self.exact = collections.Counter()
+
+    def buckets(self, values):
+        ''' the bucket of every positive value, ceil(log(value) / log(gamma)) mapped over all of them in C '''
+        return map(math.ceil, map(operator.mul, map(math.log, values), itertools.repeat(self.inverse_log_gamma)))
+
+    def add(self, values):
+        ''' count a list of finite numbers '''
+
+        self.n += len(values)
+        if self.exact is not None:
+            self.exact.update(values)
+            if len(self.exact) <= EXACT_VALUES:
+                return
+            values = list(self.exact.elements())
+            self.exact = None
+
+        self.positive.update( self.buckets([value for value in values if value > 0]) )
+        self.negative.update( self.buckets([-value for value in values if value < 0]) )
+        self.zeros += values.count(0)
+
+    def quantiles(self, probabilities):
+        ''' the quantiles for the sorted probabilities, None for all of them without values '''
+
+        if self.n == 0:
+            return [None] * len(probabilities)
+
+        # buckets from the smallest to the largest value with their count and the value in the middle of their bounds
+        if self.exact is not None:
+            buckets = sorted(self.exact.items())
+        else:
+            middle = lambda key: 2 * self.gamma ** key / (self.gamma + 1)
+            buckets = [(-middle(key), self.negative[key]) for key in sorted(self.negative, reverse=True)]
+            buckets.append( (0.0, self.zeros) )
+            buckets += [(middle(key), self.positive[key]) for key in sorted(self.positive)]
+
+        quantiles = list()
+        buckets = iter(buckets)
+        seen = 0
+        for probability in probabilities:
+            rank = probability * (self.n - 1)
+            while seen <= rank:
+                value, count = next(buckets)
+                seen += count
+            quantiles.append(value)
+        return quantiles
+
+
+class RunningStats(object):
+    '''
+    count, mean, standard deviation, extremes and approximate quantiles of a stream of numbers, added a batch at a time
+    the moments of a batch are merged into the running ones like Chan et al. do for parallel variance,
+    so the stream is never held in memory and the sums stay accurate over millions of values
+    '''
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch()
+
+    def add(self, values):
+        ''' add a list of finite numbers '''
+
+        n = len(values)
+        if n == 0:
+            return
+        mean = math.fsum(values) / n
+        m2 = math.fsum([(value - mean)**2 for value in values])
+
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta**2 * self.n * n / total
+        self.n = total
+
+        self.min = min(values) if self.min is None else min(self.min, min(values))
+        self.max = max(values) if self.max is None else max(self.max, max(values))
+        self.sketch.add(values)
+
+    def row(self):
+        ''' n, mean, sd, min, the QUANTILES and max, None for what is undefined '''
+
+        if self.n == 0:
+            return [0] + [None] * (len(QUANTILES) + 4)
+        sd = math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else None
+        # the middle of a bucket may lie beyond the extremes
+        quantiles = [min(max(value, self.min), self.max) for value in self.sketch.quantiles(QUANTILES)]
+        return [self.n, self.mean, sd, self.min] + quantiles + [self.max]
+
+
+def numbers(cells):
+    ''' the finite numbers among cells, strings are parsed like float() does, missing values and other text are dropped '''
+
+    try:
+        values = list(map(float, cells))
+    except (TypeError, ValueError):
+        values = list()
+        for cell in cells:
+            try:
+                values.append( float(cell) )
+            except (TypeError, ValueError):
+                pass
+
+    if not all(map(math.isfinite, values)):
+        values = [value for value in values if math.isfinite(value)]
+    return values
+
+
+spot_color = operator.attrgetter('color')
+
+
+def cell_text(value):
+    if value is None:
+        return 'NA'
+    if isinstance(value, float):
+        return '%.6g' % value
+    return str(value)
+
+
+class SummaryTables(object):
+    '''
+    the summary tables written with the prefix, add() takes the records of every batch of merge_batches() before it is written
+    the nuclei table is written batch by batch, its color columns are fixed by the first batch from the colors of the spot
+    and spot pair tables in auxilary_data, like the header of the merged table
+    the counts per nucleus and the distance columns are condensed into RunningStats per experiment, color and measure right away,
+    so memory does not grow with the number of nuclei, also with --streaming
+    '''
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.nuclei_file = None
+        self.count_columns = None
+        self.nucleus_count = 0
+        self.experiments = collections.OrderedDict()
+        self.counts = dict()
+        self.distances = collections.OrderedDict()
+
+    def start(self, auxilary_data):
+        ''' open the nuclei table with the colors in auxilary_data as columns '''
+
+        self.spot_colors = list(auxilary_data.get('spot_colors', []))
+        self.pair_colors = list(auxilary_data.get('pair_colors', []))
+        self.count_columns = [(color, 'spots per nucleus') for color in self.spot_colors] + [(pair, 'distances per nucleus') for pair in self.pair_colors]
+
+        header = ['experiment'] + nucleus_ID_names + ['spots'] + ['spots %s' % color for color in self.spot_colors]
+        header += ['distances'] + ['distances %s' % pair for pair in self.pair_colors]
+        self.nuclei_file = open(self.prefix + '.nuclei.tsv', 'w')
+        self.nuclei_file.write( '\t'.join(header) + '\n' )
+
+    def add(self, selected_data, auxilary_data):
+        ''' write the spots and distances of every Nucleus record in selected_data to the nuclei table and add them to the statistics '''
+
+        if self.nuclei_file is None:
+            self.start(auxilary_data)
+
+        # dropped by --columns the distance columns are not summarised
+        measures = [(i, name) for i, name in enumerate(header_names(auxilary_data.get('distance', ''))) if name.startswith(DISTANCE_MEASURE)]
+        experiment_counts = collections.OrderedDict()
+        experiment_distances = collections.OrderedDict()
+        lines = list()
+
+        for ID_s, nucleus in selected_data.items():
+            spots = collections.Counter( map(spot_color, nucleus.spots.values()) )
+            # the spot pair color ends the distance ID, e.g. dist_1_1_0_44_6_1_GFR
+            pairs = [ID_dist.rsplit('_', 1)[1] for ID_dist in nucleus.distances]
+            distances = collections.Counter(pairs)
+
+            spot_counts = [spots[color] for color in self.spot_colors]
+            pair_counts = [distances[pair] for pair in self.pair_colors]
+            row = [nucleus.experimentID] + ID_s.split('_', len(nucleus_ID_names) - 1) + [len(nucleus.spots)] + spot_counts + [len(pairs)] + pair_counts
+            lines.append( '\t'.join(map(cell_text, row)) )
+
+            experiment_counts.setdefault(nucleus.experimentID, list()).append(spot_counts + pair_counts)
+            if measures:
+                experiment_distances.setdefault(nucleus.experimentID, list()).extend( zip(pairs, nucleus.distances.values()) )
+
+        if lines:
+            self.nuclei_file.write( '\n'.join(lines) + '\n' )
+        self.nucleus_count += len(lines)
+
+        for experimentID, counts in experiment_counts.items():
+            self.experiments.setdefault(experimentID, None)
+            for j, (color, measure) in enumerate(self.count_columns):
+                key = (experimentID, color, measure)
+                if key not in self.counts:
+                    self.counts[key] = RunningStats()
+                self.counts[key].add( [float(count[j]) for count in counts] )
+
+        # the distance columns of a batch are added a column, experiment and spot pair color at a time
+        for experimentID, pair_distances in experiment_distances.items():
+            self.experiments.setdefault(experimentID, None)
+            for pair in collections.OrderedDict.fromkeys(pair for pair, distance in pair_distances):
+                rows = [distance.fields for distance_pair, distance in pair_distances if distance_pair == pair]
+                for i, name in measures:
+                    key = (experimentID, pair, name)
+                    if key not in self.distances:
+                        self.distances[key] = RunningStats()
+                    self.distances[key].add( numbers(map(operator.itemgetter(i), rows)) )
+
+    def experiment_rows(self):
+        '''
+        the statistics of every experiment in the order it was first read: spots per nucleus of every color found in the experiment,
+        distances per nucleus of every spot pair color found in it and the distance columns of every spot pair color
+        '''
+
+        distance_keys = collections.OrderedDict()
+        for experimentID, pair, name in self.distances:
+            distance_keys.setdefault(experimentID, list()).append( (pair, name) )
+
+        for experimentID in self.experiments:
+            for color, measure in self.count_columns or []:
+                stats = self.counts.get( (experimentID, color, measure) )
+                if stats is not None and stats.max > 0:
+                    yield [experimentID, color, measure] + stats.row()
+
+            for pair, name in distance_keys.get(experimentID, []):
+                yield [experimentID, pair, name] + self.distances[(experimentID, pair, name)].row()
+
+    def close(self):
+        # without any batch, e.g. for an empty data folder, the nuclei table has no color columns
+        if self.nuclei_file is None:
+            self.start(dict())
+        self.nuclei_file.close()
+
+        quantile_names = ['q%02d' % round(100 * probability) for probability in QUANTILES]
+        header = ['experiment', 'color', 'measure', 'n', 'mean', 'sd', 'min'] + quantile_names + ['max']
+        with open(self.prefix + '.experiments.tsv', 'w') as out_file:
+            out_file.write( '\t'.join(header) + '\n' )
+            for row in self.experiment_rows():
+                out_file.write( '\t'.join(map(cell_text, row)) + '\n' )
@@ -0,0 +1,155 @@
+################
+# typed mode of the merge: the cells of every table are parsed to int, float or string while they are read,
+# bounding boxes like [114,69,122,86] in the Bounding Box columns become four integer columns
+# the type of every column is inferred once per table from a sample of its first rows
+################
+
+import itertools
+import re
+
+from .objects_table import column_getter
+
+# rows of a table the column types are inferred from
+SAMPLE_ROWS = 1000
+
+# like R's read.table 'NA' is missing in every column, empty cells are missing in numeric columns
+MISSING = frozenset(['NA', ''])
+
+bbox_pattern = re.compile(r'^\[(-?\d+),(-?\d+),(-?\d+),(-?\d+)\]$')
+bbox_names = ['x1', 'y1', 'x2', 'y2']
+# the columns split into the corners of their bounding boxes
+bbox_column_pattern = re.compile(r'Bounding Box')
+
+
+def infer_types(header, sample):
+    '''
+    the type of every column of header from the rows in sample: int, float, bbox or str
+    columns named like Bounding Box are bbox, whatever their values, so the layout of the output only depends on the header,
+    also for tables without rows or without a single bounding box in their sample
+    another column is numeric, if all its present values are, columns without values are str
+    '''
+
+    types = list()
+    for i, name in enumerate(header):
+        if bbox_column_pattern.search(name):
+            types.append('bbox')
+            continue
+        present = [fields[i] for fields in sample if fields[i] not in MISSING]
+
+        column_type = 'str'
+        if present:
+            for candidate, convert in [('int', int), ('float', float)]:
+                try:
+                    for value in present:
+                        convert(value)
+                except ValueError:
+                    continue
+                column_type = candidate
+                break
+        types.append(column_type)
+    return types
+
+
+# a value, which does not fit the type of its column, keeps the widest type it fits, so no value is ever lost
+
+def float_cell(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None if value in MISSING else value
+
+
+def int_cell(value):
+    try:
+        return int(value)
+    except ValueError:
+        return float_cell(value)
+
+
+def str_cell(value):
+    return None if value == 'NA' else value
+
+
+def bbox_cell(value):
+    match = bbox_pattern.match(value)
+    if match is not None:
+        return tuple(map(int, match.groups()))
+    if value in MISSING:
+        return (None, None, None, None)
+    return (value, None, None, None)
+
+
+converters = {'int': int_cell, 'float': float_cell, 'str': str_cell, 'bbox': bbox_cell}
+
+
+class TypedColumns(object):
+    '''
+    the typed columns of one table: header and types are those of the output, bounding boxes are split into their four corners
+    convert() turns the cells of a row, as read by ObjectsTable.rows(), into a tuple of typed values
+    '''
+
+    def __init__(self, header, types):
+        self.converters = [converters[column_type] for column_type in types]
+        self.bbox_columns = [i for i, column_type in enumerate(types) if column_type == 'bbox']
+
+        self.header = list()
+        self.types = list()
+        for name, column_type in zip(header, types):
+            if column_type == 'bbox':
+                self.header += ['%s %s' % (name, corner) for corner in bbox_names]
+                self.types += ['int'] * len(bbox_names)
+            else:
+                self.header.append(name)
+                self.types.append(column_type)
+        
+        # the fast path of convert() parses all columns of a type with one map() and puts the cells in place with one itemgetter
+        by_type = dict( (column_type, [i for i, t in enumerate(types) if t == column_type]) for column_type in converters )
+        self.int_getter = column_getter(by_type['int'])
+        self.float_getter = column_getter(by_type['float'])
+        self.str_getter = column_getter(by_type['str'])
+        self.bbox_getter = column_getter(by_type['bbox'])
+        
+        # position of every output column in the cells of the fast path: ints, floats, strings, then the corners of every bounding box
+        position = dict()
+        for i in by_type['int'] + by_type['float'] + by_type['str']:
+            position[i] = len(position)
+        start = len(position)
+        order = list()
+        for i, column_type in enumerate(types):
+            if column_type == 'bbox':
+                first = start + len(bbox_names) * by_type['bbox'].index(i)
+                order += range(first, first + len(bbox_names))
+            else:
+                order.append(position[i])
+        self.order = column_getter(order)
+
+    def convert(self, fields):
+        try:
+            strings = self.str_getter(fields)
+            if 'NA' in strings:
+                raise ValueError
+            cells = tuple(map(int, self.int_getter(fields))) + tuple(map(float, self.float_getter(fields))) + strings
+            for value in self.bbox_getter(fields):
+                cells += tuple(map(int, bbox_pattern.match(value).groups()))
+        # missing values, values not fitting their column and malformed bounding boxes are converted cell by cell
+        except (ValueError, AttributeError):
+            return self.convert_cells(fields)
+        return self.order(cells)
+
+    def convert_cells(self, fields):
+        values = list(map(lambda convert, value: convert(value), self.converters, fields))
+        # split the bounding boxes from the last one, so the index of the others stays valid
+        for i in reversed(self.bbox_columns):
+            values[i:i + 1] = values[i]
+        return tuple(values)
+
+
+def typed_rows(table):
+    '''
+    infer the column types of an ObjectsTable with a header from its first SAMPLE_ROWS rows
+    returns the TypedColumns and an iterator over all rows of the table, the sample included
+    '''
+
+    rows = table.rows()
+    sample = list(itertools.islice(rows, SAMPLE_ROWS))
+    return TypedColumns(table.header, infer_types(table.header, sample)), itertools.chain(sample, rows)
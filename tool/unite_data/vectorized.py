@@ -0,0 +1,336 @@
+################
+# the vectorized merge engine, --engine vectorized
+# the same merge as read_measurement() and merged_lines(), but every table is loaded in bulk
+# and joined with pandas; the result is one row per output line of a measurement folder
+# pandas is imported by the functions, so the package works without it
+################
+
+import csv
+import io
+
+from .inputs import TableFiles
+from .merge import table_roles, nucleus_out_header, spot_out_header, distance_out_header, spot_dist_columns, header_names
+from .objects_table import ObjectsTable
+from .profile import StageProfile
+from .selection import Selection
+
+# the output line columns of read_measurement_frame()
+frame_columns = ['ID_s', 'npos', 'dpos', 'head', 'head_width', 'tail', 'tail_width', 'nodist', 'replay']
+
+
+def read_table_frame(in_file):
+    '''
+    load one Objects table in bulk
+    returns the experiment ID, the header and a DataFrame of strings with one column per header field,
+    header is None, if the table has no [Data] block
+    '''
+    
+    import pandas
+    
+    table = ObjectsTable(in_file)
+    if table.header is None:
+        return table.experimentID, None, None
+    
+    experimentID = table.experimentID
+    header = table.header
+    names = list(range(len(header)))
+    body = table.text()
+    
+    if body.strip('\n') == '':
+        return experimentID, header, pandas.DataFrame(dict((i, pandas.Series([], dtype=object)) for i in names))
+    
+    options = dict(sep='\t', header=None, names=names, dtype=object, keep_default_na=False, quoting=csv.QUOTE_NONE)
+    try:
+        frame = pandas.read_csv(io.StringIO(body), **options)
+        short_lines = frame.isna().any(axis=1)
+    except pandas.errors.ParserError:
+        # lines with more fields than the header are cut to the length of the header like ObjectsTable.rows() does
+        frame = pandas.read_csv(io.StringIO(body), usecols=names, **options)
+        lines = pandas.Series(body.split('\n'))
+        short_lines = lines[lines != ''].str.count('\t') + 1 < len(header)
+    
+    if short_lines.any():
+        raise IndexError( "line has fewer fields than the header ({0}) in line {1} of the data block".format(len(header), short_lines.values.argmax() + 1) )
+    return experimentID, header, frame
+
+
+def join_columns(frame, columns, separator='_'):
+    ''' the cells of some columns of every line joined by separator, done column by column for short IDs '''
+    
+    joined = frame[columns[0]]
+    for column in columns[1:]:
+        joined = joined + separator + frame[column]
+    return joined
+
+
+def line_text(frame, first=None, last=None):
+    ''' every line of a table frame joined by tabs, the cells first and last are added before and after in the same go '''
+    
+    import pandas
+    
+    # a frame without columns, e.g. after --columns, is just the added cells
+    if frame.shape[1] == 0:
+        return pandas.Series( '\t'.join(cell for cell in [first, last] if cell is not None), index=frame.index, dtype=object )
+    
+    prefix = '' if first is None else first + '\t'
+    suffix = '' if last is None else '\t' + last
+    # joining the rows of a list is faster than concatenating the columns with str.cat() or numpy, which copy every partial line
+    return pandas.Series( [prefix + '\t'.join(cells) + suffix for cells in frame.values.tolist()], index=frame.index, dtype=object )
+
+
+def keep_last(frame, key):
+    ''' drop repeated keys like assigning to an OrderedDict: the first position is kept with the values of the last line '''
+    
+    if not frame[key].duplicated().any():
+        return frame.reset_index(drop=True)
+    order = frame.drop_duplicates(key, keep='first')[key].values
+    return frame.drop_duplicates(key, keep='last').set_index(key).loc[order].reset_index()
+
+
+def check_nuclei(frame, nuclei, table):
+    ''' lines referring to a nucleus, which is not selected, fail like in read_measurement() '''
+    
+    missing = ~frame['ID_s'].isin(nuclei['ID_s'])
+    if missing.any():
+        raise KeyError( "{0} line of nucleus {1}, which is not in the selected nuclei".format(table, frame['ID_s'][missing].iloc[0]) )
+
+
+def projected(frame, header, kept):
+    ''' the frame and header cut to the kept columns of Selection.kept_columns(), None keeps all '''
+    
+    if kept is None:
+        return frame, header
+    return frame[kept], [header[i] for i in kept]
+
+
+def read_measurement_frame(file_name_set, auxilary_data, profile=None, selection=None):
+    '''
+    the vectorized counterpart of read_measurement(), output header parts go to auxilary_data, stage times to profile
+    the Selection selection drops rows and columns right after every table is loaded
+    returns a DataFrame with one row per output line of the folder, see frame_columns:
+    the order of nucleus and distance, the nucleus part of the line and the distance and spot part that follows it,
+    nuclei without distances (nodist) may need the line to be replayed from all their spots like merged_lines() does
+    '''
+    
+    import pandas
+    
+    if profile is None:
+        profile = StageProfile()
+    if selection is None:
+        selection = Selection()
+    
+    selected_index, spot_files, pair_files = table_roles(file_name_set)
+    profile.start()
+    
+    # the files are opened one at a time and closed, when the folder is read or reading fails
+    with TableFiles(file_name_set) as input_files:
+        ##################
+        # nuclei selected
+        ##################
+        experimentID, header, nuclei = read_table_frame(input_files.open(selected_index))
+        if header is None:
+            return pandas.DataFrame(columns=frame_columns)
+        
+        # a folder of another experiment is skipped, only the header of its tables is read
+        skip_folder = not selection.keep_experiment(experimentID)
+        nuclei = selection.filter_frame(nuclei.iloc[0:0] if skip_folder else nuclei, header)
+        cells, cell_header = projected(nuclei, header, selection.kept_columns(nucleus_out_header(header)[1:]))
+        auxilary_data['nucleus'] = '\t'.join( nucleus_out_header(cell_header) )
+        
+        if experimentID is None and len(nuclei):
+            raise ValueError( "no Plate Name line before the data block of {0}".format(file_name_set[selected_index]) )
+        nuclei = pandas.DataFrame({
+            'ID_s': join_columns(nuclei, [0,1,2,3,4]),
+            'head': line_text(cells, first=experimentID or ''),
+            'head_width': 1 + len(cell_header),
+        })
+        profile.count('nuclei', len(nuclei))
+        nuclei = keep_last(nuclei, 'ID_s')
+        nuclei['npos'] = range(len(nuclei))
+        profile.lap('nuclei')
+        
+        ##############
+        # color spots
+        ##############
+        spot_frames = list()
+        link_frames = list()
+        line_count = 0
+        
+        for file_index, color in spot_files:
+            experiment, header, spots = read_table_frame(input_files.open(file_index))
+            if header is None:
+                continue
+            spots = selection.filter_frame(spots.iloc[0:0] if skip_folder else spots, header)
+            cells, cell_header = projected(spots, header, selection.kept_columns(spot_out_header(header)[:-1]))
+            if not spot_frames:
+                auxilary_data['spot'] = spot_out_header(cell_header)
+            
+            profile.count('spots', len(spots))
+            line = pandas.RangeIndex(line_count, line_count + len(spots))
+            line_count += len(spots)
+            spots.index = line
+            cells.index = line
+            
+            ID_s = join_columns(spots, [0,1,2,3,20])
+            spot_frames.append( pandas.DataFrame({
+                'line': line,
+                'ID_s': ID_s,
+                'ID_spot': 'spot_' + ID_s + '_' + spots[4] + '_' + color,
+                'text': line_text(cells, last=color),
+                'width': len(cell_header) + 1,
+            }) )
+            
+            # the IDs, which are found in the distance feature file
+            for i, dist_count, dist_color in spot_dist_columns(header):
+                link_frames.append( pandas.DataFrame({'line': line, 'ID': dist_count + '_' + ID_s + '_' + spots[i] + '_' + dist_color}) )
+        
+        if spot_frames:
+            spots = keep_last(pandas.concat(spot_frames, ignore_index=True), 'ID_spot')
+            check_nuclei(spots, nuclei, 'spot')
+        else:
+            spots = pandas.DataFrame(columns=['line', 'ID_s', 'ID_spot', 'text', 'width'])
+        spots['rank'] = range(len(spots))
+        
+        # only the last reading of a spot links it to its distances
+        if link_frames:
+            links = pandas.concat(link_frames, ignore_index=True).merge(spots, on='line')
+        else:
+            links = pandas.DataFrame(columns=['ID', 'ID_spot', 'rank', 'text', 'width'])
+        profile.lap('spots')
+        
+        #################
+        # spot distances
+        #################
+        pair_frames = list()
+        
+        for file_index, color in pair_files:
+            experiment, header, pairs = read_table_frame(input_files.open(file_index))
+            if header is None:
+                continue
+            pairs = selection.filter_frame(pairs.iloc[0:0] if skip_folder else pairs, header)
+            cells, cell_header = projected(pairs, header, selection.kept_columns(distance_out_header(header)))
+            if not pair_frames:
+                auxilary_data['distance'] = '\t'.join( distance_out_header(cell_header) )
+            
+            profile.count('pairs', len(pairs))
+            ID_s = join_columns(pairs, [0,1,2,3,14])
+            pair_frames.append( pandas.DataFrame({
+                'ID_s': ID_s,
+                'ID_dist': 'dist_' + ID_s + '_' + pairs[13] + '_' + color,
+                'spot1': 'spot1_' + ID_s + '_' + pairs[15] + '_' + color,
+                'spot2': 'spot2_' + ID_s + '_' + pairs[16] + '_' + color,
+                'text': line_text(cells),
+                'width': len(cell_header),
+            }) )
+        
+        if pair_frames:
+            distances = keep_last(pandas.concat(pair_frames, ignore_index=True), 'ID_dist')
+            check_nuclei(distances, nuclei, 'spot pair')
+        else:
+            distances = pandas.DataFrame(columns=['ID_s', 'ID_dist', 'spot1', 'spot2', 'text', 'width'])
+        distances['dpos'] = range(len(distances))
+        profile.lap('pairs')
+    
+    # spots of a distance are found by their IDs and written in the order they were read
+    matched = pandas.concat([
+        distances[['dpos', 'spot1']].merge(links, left_on='spot1', right_on='ID'),
+        distances[['dpos', 'spot2']].merge(links, left_on='spot2', right_on='ID'),
+    ])
+    matched = matched.drop_duplicates(['dpos', 'ID_spot']).sort_values(['dpos', 'rank'])
+    # summing strings concatenates them in C, which is much faster than joining every group in Python
+    distance_spots = pandas.DataFrame({'spot_text': '\t' + matched['text'], 'spot_width': matched['width']}).groupby(matched['dpos']).sum()
+    
+    distances = distances.join(distance_spots, on='dpos')
+    distance_lines = pandas.DataFrame({
+        'ID_s': distances['ID_s'],
+        'dpos': distances['dpos'],
+        # without distance cells, e.g. after --columns, the spots start the tail
+        'tail': (distances['text'] + distances['spot_text'].fillna('')).where(distances['width'] > 0, distances['spot_text'].fillna('').str[1:]),
+        'tail_width': distances['width'] + distances['spot_width'].fillna(0).astype(int),
+        'nodist': False,
+        'replay': None,
+    })
+    
+    # nuclei without distances get the last of their spots, earlier wider spots leave their remains in the line
+    nodist_spots = spots[~spots['ID_s'].isin(distances['ID_s'])]
+    last_spots = nodist_spots.drop_duplicates('ID_s', keep='last').set_index('ID_s')
+    widest = nodist_spots.groupby('ID_s')['width'].max()
+    replay = nodist_spots[ nodist_spots['ID_s'].map(widest) > nodist_spots['ID_s'].map(last_spots['width']) ].groupby('ID_s')['text'].agg(list)
+    
+    nodist_nuclei = nuclei.loc[~nuclei['ID_s'].isin(distances['ID_s']), 'ID_s']
+    nodist_lines = pandas.DataFrame({
+        'ID_s': nodist_nuclei,
+        'dpos': -1,
+        'tail': nodist_nuclei.map(last_spots['text']).fillna(''),
+        'tail_width': nodist_nuclei.map(last_spots['width']).fillna(0).astype(int),
+        'nodist': True,
+        'replay': nodist_nuclei.map(replay),
+    })
+    
+    lines = pandas.concat([distance_lines, nodist_lines], ignore_index=True).merge(nuclei, on='ID_s')
+    lines = lines.sort_values(['npos', 'dpos'], kind='stable')[frame_columns].reset_index(drop=True)
+    profile.lap('join')
+    return lines
+
+
+def fold_frames(frames):
+    '''
+    fold the frames of all measurement folders like selected_data.update() folds the nuclei:
+    a nucleus keeps the position of the first folder it appears in and the lines of the last
+    '''
+    
+    import pandas
+    
+    if not frames:
+        return pandas.DataFrame(columns=frame_columns)
+    
+    frame = pandas.concat([frame.assign(folder=i) for i, frame in enumerate(frames)], ignore_index=True)
+    first = frame.drop_duplicates('ID_s', keep='first')[['ID_s', 'folder', 'npos']]
+    first.columns = ['ID_s', 'first_folder', 'first_npos']
+    
+    frame = frame[ frame['folder'] == frame.groupby('ID_s')['folder'].transform('max') ]
+    frame = frame.merge(first, on='ID_s').sort_values(['first_folder', 'first_npos', 'dpos'], kind='stable')
+    return frame[frame_columns].reset_index(drop=True)
+
+
+def frame_lines(frame, auxilary_data):
+    ''' the text lines of the merged table for the rows of a folded frame, padded with NA like merged_lines() '''
+    
+    import pandas
+    
+    nucleus_header_count = len(header_names(auxilary_data['nucleus']))
+    distance_header_count = len(header_names(auxilary_data['distance']))
+    spot_header_count = len(auxilary_data['spot'])
+    total = nucleus_header_count + distance_header_count + 2*spot_header_count
+    offset = nucleus_header_count + distance_header_count
+    
+    if len(frame) == 0:
+        return list()
+    
+    head_width = frame['head_width'].astype(int)
+    tail_width = frame['tail_width'].astype(int)
+    
+    def pad(count):
+        return pandas.Series('\tNA', index=frame.index, dtype=object) * count.clip(lower=0)
+    
+    # distance lines: nucleus, distance and spots follow each other
+    lines = frame['head'] + ('\t' + frame['tail']).where(tail_width > 0, '') + pad(total - head_width - tail_width)
+    
+    # nuclei without distances: the spot starts after the distance fields
+    nodist = frame['nodist'].astype(bool)
+    spot_part = frame['tail'].where(tail_width == 0, '\t' + frame['tail']).where(tail_width > 0, '')
+    nodist_lines = frame['head'] + pad(offset - head_width) + spot_part + pad(total - offset - tail_width)
+    lines = lines.where(~nodist, nodist_lines)
+    
+    # the few lines, where spots overwrite each other or the nucleus, are rebuilt cell by cell
+    replay = nodist & ( frame['replay'].notna() | (head_width > offset) )
+    for i in frame.index[replay]:
+        out_line = frame['head'][i].split('\t')
+        out_line += ['NA'] * (total - len(out_line))
+        spots = frame['replay'][i] if isinstance(frame['replay'][i], list) else [frame['tail'][i]] if tail_width[i] else []
+        for spot in spots:
+            cells = spot.split('\t')
+            out_line[offset:offset + len(cells)] = cells
+        lines[i] = '\t'.join(out_line)
+    
+    return lines.tolist()